@@ -1,4 +1,6 @@
 from .db import Database
 from .main import DataStore
+from .symbols import SymbolCache
+from .cache import ParquetCache
 
-__all__ = ["Database", "DataStore"]
+__all__ = ["Database", "DataStore", "SymbolCache", "ParquetCache"]
@@ -0,0 +1,55 @@
+"""
+Compares the PGWire and HTTP/Arrow read paths of DataStore.
+
+    uv run bench.py TATASTEEL.NSE 2023-01-01 2025-01-01
+
+Each path runs in a fresh process so peak RSS isn't shared between them.
+"""
+
+import sys
+import time
+import resource
+import multiprocessing as mp
+
+
+def _run(reader: str, ticker: str, start_date: str, end_date: str, queue):
+    from main import DataStore
+
+    ds = DataStore(reader=reader)  # type: ignore
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    started = time.perf_counter()
+    df = ds._query_raw(ticker, start_date, end_date)
+    elapsed = time.perf_counter() - started
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((reader, len(df), elapsed, (peak - baseline) / 1024))
+
+
+def main():
+    if len(sys.argv) != 4:
+        print(__doc__)
+        sys.exit(1)
+
+    ticker, start_date, end_date = sys.argv[1:]
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+
+    print(f"{'reader':<8}{'rows':>12}{'seconds':>10}{'rows/sec':>14}{'peak MB':>10}")
+
+    for reader in ("pg", "http"):
+        process = ctx.Process(
+            target=_run, args=(reader, ticker, start_date, end_date, queue)
+        )
+        process.start()
+        process.join()
+
+        reader, rows, elapsed, peak_mb = queue.get()
+        print(
+            f"{reader:<8}{rows:>12}{elapsed:>10.2f}"
+            f"{rows / elapsed if elapsed else 0:>14.0f}{peak_mb:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
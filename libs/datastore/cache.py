@@ -0,0 +1,90 @@
+import os
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import date
+from typing import Iterable
+
+CACHE_DIR = os.getenv("DATASTORE_CACHE_DIR", ".cache/market_data")
+
+# 1M bars in a 09:15-15:30 session, fewer means the day may still be filled
+SESSION_BARS = 375
+
+RAW_COLUMNS = ["ticker", "ts", "open", "high", "low", "close", "volume", "oi"]
+
+RAW_SCHEMA = pa.schema(
+    [
+        ("ticker", pa.string()),
+        ("ts", pa.timestamp("ns", tz="UTC")),
+        ("open", pa.float64()),
+        ("high", pa.float64()),
+        ("low", pa.float64()),
+        ("close", pa.float64()),
+        ("volume", pa.int64()),
+        ("oi", pa.float64()),
+    ]
+)
+
+
+class ParquetCache:
+    """
+    On-disk cache of raw 1M market data, one Parquet file per ticker and
+    trading day. Only complete sessions are cached, partial or empty days are
+    read live until backfill or gap repair fills them; the current day is
+    never cached.
+    """
+
+    def __init__(self, root: str = CACHE_DIR):
+        self.root = root
+
+    def _path(self, ticker: str, day: date):
+        return os.path.join(self.root, ticker, f"{day.isoformat()}.parquet")
+
+    def has(self, ticker: str, day: date) -> bool:
+        return os.path.exists(self._path(ticker, day))
+
+    def missing(self, ticker: str, days: list[date]) -> list[date]:
+        return [day for day in days if not self.has(ticker, day)]
+
+    def is_complete(self, df: pd.DataFrame) -> bool:
+        return len(df) >= SESSION_BARS
+
+    def write(self, ticker: str, day: date, df: pd.DataFrame):
+        path = self._path(ticker, day)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        table = pa.Table.from_pandas(
+            df[RAW_COLUMNS], schema=RAW_SCHEMA, preserve_index=False
+        )
+        tmp_path = path + ".tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+
+    def read(self, ticker: str, days: list[date]) -> pd.DataFrame:
+        tables = [
+            pq.read_table(self._path(ticker, day), memory_map=True)
+            for day in days
+            if self.has(ticker, day)
+        ]
+
+        if not tables:
+            return RAW_SCHEMA.empty_table().to_pandas()
+
+        return pa.concat_tables(tables).to_pandas()
+
+    def invalidate(self, ticker: str | None = None, day: date | None = None):
+        if ticker is None:
+            shutil.rmtree(self.root, ignore_errors=True)
+            return
+
+        if day is None:
+            shutil.rmtree(os.path.join(self.root, ticker), ignore_errors=True)
+            return
+
+        if self.has(ticker, day):
+            os.remove(self._path(ticker, day))
+
+    def invalidate_days(self, ticker: str, days: Iterable[date]):
+        for day in days:
+            self.invalidate(ticker, day)
@@ -0,0 +1,94 @@
+import os
+import re
+import requests
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from datetime import datetime, timezone
+
+
+def _http_url():
+    url = os.getenv("QDB_HTTP_URL")
+    if url:
+        return url.rstrip("/")
+
+    # Reuse the ILP client config, e.g. "http::addr=localhost:9000;"
+    conf = os.getenv("QDB_CLIENT_CONF", "")
+    match = re.search(r"addr=([^;]+)", conf)
+    scheme = "https" if conf.startswith("https") else "http"
+
+    if match and conf.startswith("http"):
+        return f"{scheme}://{match.group(1)}"
+
+    return "http://localhost:9000"
+
+
+QDB_HTTP_URL = _http_url()
+QDB_HTTP_TIMEOUT = float(os.getenv("QDB_HTTP_TIMEOUT", "60"))
+
+# Large blocks keep the number of Arrow chunks (and Python calls) small
+CSV_BLOCK_SIZE = 8 << 20
+
+_session = requests.Session()
+
+
+def sql_literal(value) -> str:
+    if value is None:
+        return "NULL"
+
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+
+    if isinstance(value, (int, float)):
+        return repr(value)
+
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        value = value.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def render_query(query: str, params: list | tuple = ()) -> str:
+    """Inlines %s placeholders, /exp has no bind parameters"""
+    parts = query.split("%s")
+
+    if len(parts) - 1 != len(params):
+        raise ValueError("Query placeholders don't match the number of params")
+
+    rendered = [parts[0]]
+    for value, part in zip(params, parts[1:]):
+        rendered.append(sql_literal(value))
+        rendered.append(part)
+
+    return "".join(rendered)
+
+
+def fetch_arrow(
+    query: str,
+    params: list | tuple = (),
+    column_types: dict[str, pa.DataType] | None = None,
+) -> pa.Table:
+    """
+    Streams a query through QuestDB's HTTP CSV export straight into Arrow
+    buffers, without materialising a Python object per row.
+    """
+    response = _session.get(
+        f"{QDB_HTTP_URL}/exp",
+        params={"query": render_query(query, params)},
+        stream=True,
+        timeout=QDB_HTTP_TIMEOUT,
+    )
+    response.raise_for_status()
+    response.raw.decode_content = True
+
+    reader = pacsv.open_csv(
+        response.raw,
+        read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+        convert_options=pacsv.ConvertOptions(column_types=column_types or {}),
+    )
+
+    try:
+        return reader.read_all()
+    finally:
+        response.close()
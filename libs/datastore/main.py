@@ -1,7 +1,14 @@
+import os
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from typing import Literal
+from zoneinfo import available_timezones
 from db import Database
-from datetime import timezone
+from cache import ParquetCache, RAW_COLUMNS, RAW_SCHEMA
+from columnar import fetch_arrow
+from symbols import SymbolCache
+from datetime import datetime
 
 freq_map = {
     "1M": "1T",  # 1 minute
@@ -16,84 +23,382 @@ freq_map = {
     "1D": "1D",  # 1 day
 }
 
+sample_by_map = {
+    "1M": "1m",
+    "2M": "2m",
+    "5M": "5m",
+    "10M": "10m",
+    "15M": "15m",
+    "30M": "30m",
+    "1H": "1h",
+    "2H": "2h",
+    "4H": "4h",
+    "1D": "1d",
+}
+
+# Intraday bars are bucketed from the session open, like the live feed's
+# aggregator, every timeframe divides a day so buckets repeat daily
+SESSION_OPEN = "09:15"
+INTRADAY_OFFSET = pd.Timedelta(hours=9, minutes=15)
+
+# "http" streams rows through QuestDB's CSV export into Arrow, "pg" uses PGWire
+DATASTORE_READER = os.getenv("DATASTORE_READER", "http")
+
+RAW_COLUMN_TYPES = {field.name: field.type for field in RAW_SCHEMA}
+
+# Columns of resampled bars, whichever path built them
+BAR_COLUMNS = ["open", "high", "low", "close", "volume", "oi"]
+
+MANY_CHUNK_SIZE = 100
+# Stays well under the Database pool's max_size
+MANY_MAX_WORKERS = 4
+
+
+@lru_cache(maxsize=1)
+def _timezones() -> frozenset[str]:
+    return frozenset(available_timezones())
+
+
+def _check_tz(tz: str):
+    # Time zones are formatted into SAMPLE BY, only known IANA names pass
+    if tz not in _timezones():
+        raise ValueError(f"Invalid time zone: {tz}")
+
 
 class DataStore:
+    def __init__(
+        self,
+        cache: ParquetCache | None = None,
+        reader: Literal["http", "pg"] = DATASTORE_READER,  # type: ignore
+    ):
+        self.cache = cache or ParquetCache()
+        self.reader = reader
+
     def get_ticker(self, ticker: str):
-        with Database.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM symbols WHERE query_key = %s", (ticker,))
-                data = cursor.fetchone()
+        data = SymbolCache.get(ticker)
 
-                if data is None:
-                    raise ValueError(f"Ticker {ticker} not found in database")
+        if data is None:
+            raise ValueError(f"Ticker {ticker} not found in database")
 
-                return data
+        return data
 
-    def get_historic_data(
+    def _where(
         self,
-        ticker: str,
-        freq: Literal["1M", "2M", "5M", "10M", "15M", "30M", "1H", "2H", "4H", "1D"],
-        start_date: str | None = None,
-        end_date: str | None = None,
-        tz: str = "Asia/Kolkata",
-    ):
-        query_chunks = ["SELECT * FROM market_data WHERE ticker = %s"]
-        params = [ticker]
+        ticker: str | list[str],
+        start_date: str | datetime | None = None,
+        end_date: str | datetime | None = None,
+        end_inclusive: bool = True,
+    ) -> tuple[list[str], list]:
+        if isinstance(ticker, str):
+            query_chunks = ["WHERE ticker = %s"]
+            params: list = [ticker]
+        else:
+            placeholders = ", ".join(["%s"] * len(ticker))
+            query_chunks = [f"WHERE ticker IN ({placeholders})"]
+            params = list(ticker)
 
         if start_date:
             query_chunks.append("AND ts >= %s")
             params.append(start_date)
 
         if end_date:
-            query_chunks.append("AND ts <= %s")
+            query_chunks.append("AND ts <= %s" if end_inclusive else "AND ts < %s")
             params.append(end_date)
 
+        return query_chunks, params
+
+    def _query_raw(
+        self,
+        ticker: str | list[str],
+        start_date: str | datetime | None = None,
+        end_date: str | datetime | None = None,
+        end_inclusive: bool = True,
+    ) -> pd.DataFrame:
+        where, params = self._where(ticker, start_date, end_date, end_inclusive)
+        query_chunks = ["SELECT * FROM market_data", *where]
         query_chunks.append("ORDER BY ts;")
         query = " ".join(query_chunks)
+
+        return self._execute(query, params)
+
+    def _query_sampled(
+        self,
+        ticker: str | list[str],
+        freq: str,
+        start_date: str | None = None,
+        end_date: str | None = None,
+        tz: str = "Asia/Kolkata",
+    ) -> pd.DataFrame:
+        _check_tz(tz)
+
+        where, params = self._where(ticker, start_date, end_date)
+        query_chunks = [
+            """
+            SELECT ticker, ts, first(open) AS open, max(high) AS high,
+                   min(low) AS low, last(close) AS close,
+                   sum(volume) AS volume, last(oi) AS oi
+            FROM market_data
+            """,
+            *where,
+        ]
+
+        # Buckets follow the exchange calendar, like resampling in `tz` does
+        sample_by = f"SAMPLE BY {sample_by_map[freq]} ALIGN TO CALENDAR TIME ZONE '{tz}'"
+        if freq != "1D":
+            sample_by += f" WITH OFFSET '{SESSION_OPEN}'"
+
+        query_chunks.append(sample_by)
+        query_chunks.append("ORDER BY ts;")
+        query = " ".join(query_chunks)
+
+        return self._execute(query, params)
+
+    def _execute(self, query: str, params: list) -> pd.DataFrame:
         print(query, params)
 
+        if self.reader == "http":
+            try:
+                return self._query_arrow(query, params)
+            except Exception as e:
+                print("[datastore] HTTP export failed, falling back to PGWire:", e)
+
         with Database.get_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute(query, params)  # type: ignore
                 data = cursor.fetchall()
 
                 if data is None:
-                    raise ValueError(f"No data found for ticker {ticker}")
-
-                df = pd.DataFrame(
-                    data,
-                    columns=[
-                        "ticker",
-                        "ts",
-                        "open",
-                        "high",
-                        "low",
-                        "close",
-                        "volume",
-                        "oi",
-                    ],
+                    raise ValueError("No data found")
+
+                df = pd.DataFrame(data, columns=RAW_COLUMNS)
+                df["ts"] = pd.to_datetime(df["ts"], utc=True)
+
+                return df
+
+    def _query_arrow(self, query: str, params: list) -> pd.DataFrame:
+        table = fetch_arrow(query, params, RAW_COLUMN_TYPES)
+        df = table.to_pandas()
+
+        for column in RAW_COLUMNS:
+            if column not in df.columns:
+                df[column] = None
+
+        return df[RAW_COLUMNS]
+
+    def _load_cached(
+        self,
+        ticker: str,
+        start_date: str,
+        end_date: str,
+        tz: str,
+    ) -> pd.DataFrame:
+        start = pd.Timestamp(start_date)
+        end = pd.Timestamp(end_date)
+        start = start.tz_localize(tz) if start.tzinfo is None else start.tz_convert(tz)
+        end = end.tz_localize(tz) if end.tzinfo is None else end.tz_convert(tz)
+
+        today = pd.Timestamp.now(tz=tz).date()
+        days = [
+            day
+            for day in pd.date_range(start.normalize(), end.normalize(), freq="D").date
+            if day < today
+        ]
+
+        # Fill missing partitions from QuestDB with one range query
+        missing = self.cache.missing(ticker, days)
+        live: list[pd.DataFrame] = []
+        if missing:
+            fetch_start = pd.Timestamp(min(missing)).tz_localize(tz)
+            fetch_end = pd.Timestamp(max(missing)).tz_localize(tz) + pd.Timedelta(days=1)
+            fetched = self._query_raw(
+                ticker,
+                fetch_start.to_pydatetime(),
+                fetch_end.to_pydatetime(),
+                end_inclusive=False,
+            )
+            fetched_days = fetched["ts"].dt.tz_convert(tz).dt.date
+
+            for day in missing:
+                day_df = fetched[fetched_days == day]
+
+                if self.cache.is_complete(day_df):
+                    self.cache.write(ticker, day, day_df)
+                else:
+                    live.append(day_df)
+
+        frames = [self.cache.read(ticker, days), *live]
+
+        # The current day is still being written, always read it live
+        if end.date() >= today:
+            today_start = pd.Timestamp(today).tz_localize(tz)
+            frames.append(
+                self._query_raw(
+                    ticker,
+                    max(start, today_start).to_pydatetime(),
+                    end.to_pydatetime(),
                 )
+            )
+
+        df = pd.concat([frame for frame in frames if not frame.empty], ignore_index=True)
+        if df.empty:
+            return frames[0]
+
+        # Uncached days are appended after the cached ones
+        if live:
+            df = df.sort_values("ts", ignore_index=True)
 
-                df["ts"] = pd.to_datetime(df["ts"], utc=True).dt.tz_convert(tz)
+        return df[(df["ts"] >= start) & (df["ts"] <= end)]
+
+    def get_historic_data(
+        self,
+        ticker: str,
+        freq: Literal["1M", "2M", "5M", "10M", "15M", "30M", "1H", "2H", "4H", "1D"],
+        start_date: str | None = None,
+        end_date: str | None = None,
+        tz: str = "Asia/Kolkata",
+        use_cache: bool = True,
+        pushdown: bool = True,
+    ):
+        if freq not in freq_map.keys():
+            raise ValueError(f"Invalid frequency: {freq}")
+
+        _check_tz(tz)
+
+        # Aggregate inside QuestDB so only the bars cross the wire
+        if freq != "1M" and pushdown:
+            try:
+                df = self._query_sampled(ticker, freq, start_date, end_date, tz)
+                df["ts"] = df["ts"].dt.tz_convert(tz)
                 df.set_index("ts", inplace=True)
+                df.dropna(subset=["open", "close"], inplace=True)
 
-                if freq != "1M":
-                    if freq not in freq_map.keys():
-                        raise ValueError(f"Invalid frequency: {freq}")
-
-                    df = df.resample(freq_map[freq]).agg(
-                        {
-                            "open": "first",
-                            "high": "max",
-                            "low": "min",
-                            "close": "last",
-                            "volume": "sum",
-                            "oi": "last",
-                        }
-                    )
-                    df.dropna(inplace=True)
+                return df[BAR_COLUMNS]
+            except Exception as e:
+                print("[datastore] SAMPLE BY failed, resampling in pandas:", e)
 
-                return df
+        # Only bounded ranges can be mapped onto day partitions
+        if use_cache and start_date and end_date:
+            df = self._load_cached(ticker, start_date, end_date, tz)
+        else:
+            df = self._query_raw(ticker, start_date, end_date)
+
+        df["ts"] = df["ts"].dt.tz_convert(tz)
+        df.set_index("ts", inplace=True)
+
+        if freq != "1M":
+            df = self._resample(df, freq)
+
+        return df
+
+    def _resample(self, df: pd.DataFrame, freq: str) -> pd.DataFrame:
+        offset = INTRADAY_OFFSET if freq != "1D" else None
+        df = df.resample(freq_map[freq], origin="start_day", offset=offset).agg(
+            {
+                "open": "first",
+                "high": "max",
+                "low": "min",
+                "close": "last",
+                "volume": "sum",
+                "oi": "last",
+            }
+        )
+        df.dropna(inplace=True)
+
+        return df
+
+    def _empty(self, freq: str, tz: str) -> pd.DataFrame:
+        """Frame without bars, typed like the ones loaded for `freq`"""
+        df = RAW_SCHEMA.empty_table().to_pandas()
+        df["ts"] = df["ts"].dt.tz_convert(tz)
+        df.set_index("ts", inplace=True)
+
+        return df if freq == "1M" else df[BAR_COLUMNS]
+
+    def _load_many(
+        self,
+        tickers: list[str],
+        freq: str,
+        start_date: str | None,
+        end_date: str | None,
+        tz: str,
+        pushdown: bool,
+    ) -> dict[str, pd.DataFrame]:
+        df = None
+
+        if freq != "1M" and pushdown:
+            try:
+                df = self._query_sampled(tickers, freq, start_date, end_date, tz)
+            except Exception as e:
+                print("[datastore] SAMPLE BY failed, resampling in pandas:", e)
+
+        resample = df is None and freq != "1M"
+        if df is None:
+            df = self._query_raw(tickers, start_date, end_date)
+
+        df["ts"] = df["ts"].dt.tz_convert(tz)
+        frames = {}
+
+        for tick, group in df.groupby("ticker", sort=False):
+            group = group.set_index("ts")
+
+            if resample:
+                group = self._resample(group, freq)
+            elif freq != "1M":
+                group = group[BAR_COLUMNS]
+
+            frames[str(tick)] = group
+
+        return frames
+
+    def get_historic_data_many(
+        self,
+        tickers: list[str],
+        freq: Literal["1M", "2M", "5M", "10M", "15M", "30M", "1H", "2H", "4H", "1D"],
+        start_date: str | None = None,
+        end_date: str | None = None,
+        tz: str = "Asia/Kolkata",
+        pushdown: bool = True,
+        as_frame: Literal["dict", "multiindex"] = "dict",
+        chunk_size: int = MANY_CHUNK_SIZE,
+        max_workers: int = MANY_MAX_WORKERS,
+    ) -> dict[str, pd.DataFrame] | pd.DataFrame:
+        """
+        Loads many tickers with one `ticker IN (...)` query per chunk of
+        `chunk_size` tickers, chunks run in parallel over the connection pool.
+        Tickers without data map to empty frames.
+        """
+        if freq not in freq_map.keys():
+            raise ValueError(f"Invalid frequency: {freq}")
+
+        _check_tz(tz)
+
+        tickers = list(dict.fromkeys(tickers))
+        chunks = [
+            tickers[idx : idx + chunk_size] for idx in range(0, len(tickers), chunk_size)
+        ]
+
+        frames: dict[str, pd.DataFrame] = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks)))) as pool:
+            for result in pool.map(
+                lambda chunk: self._load_many(
+                    chunk, freq, start_date, end_date, tz, pushdown
+                ),
+                chunks,
+            ):
+                frames.update(result)
+
+        # Separate frames, callers may fill in the one of a ticker
+        frames = {
+            tick: frames[tick] if tick in frames else self._empty(freq, tz)
+            for tick in tickers
+        }
+
+        if as_frame == "multiindex":
+            return pd.concat(frames, names=["ticker", "ts"]).drop(
+                columns="ticker", errors="ignore"
+            )
+
+        return frames
 
     def add_to_priority(self, ticker: str):
         if ticker is None:
@@ -115,6 +420,8 @@ class DataStore:
 
                 conn.commit()
 
+        SymbolCache.refresh(ticker)
+
     def remove_from_priority(self, ticker: str):
         if ticker is None:
             raise ValueError("Please provide the ticker")
@@ -136,6 +443,8 @@ class DataStore:
 
                 conn.commit()
 
+        SymbolCache.refresh(ticker)
+
 
 if __name__ == "__main__":
     ds = DataStore()
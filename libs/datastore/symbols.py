@@ -0,0 +1,98 @@
+import os
+import time
+import threading
+from db import Database
+
+SYMBOLS_CACHE_TTL = float(os.getenv("SYMBOLS_CACHE_TTL", "3600"))
+
+# Positions within a `SELECT * FROM symbols` row
+QUERY_KEY = 0
+FETCH_KEY = 1
+EXCHANGE_TOKEN = 9
+
+
+class SymbolCache:
+    """
+    Process-wide symbol master, loaded once in bulk and indexed by
+    query_key, fetch_key and exchange_token. Rows are the same tuples
+    `SELECT * FROM symbols` returns, so callers can keep indexing them.
+    """
+
+    _by_query_key: dict[str, tuple] = {}
+    _by_fetch_key: dict[str, tuple] = {}
+    _by_exchange_token: dict[str, tuple] = {}
+    _loaded_at: float | None = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def _index(cls, row: tuple):
+        cls._by_query_key[row[QUERY_KEY]] = row
+        cls._by_fetch_key[row[FETCH_KEY]] = row
+        cls._by_exchange_token[str(row[EXCHANGE_TOKEN])] = row
+
+    @classmethod
+    def load(cls):
+        with Database.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT * FROM symbols")
+                rows = cursor.fetchall()
+
+        with cls._lock:
+            cls._by_query_key = {}
+            cls._by_fetch_key = {}
+            cls._by_exchange_token = {}
+
+            for row in rows:
+                cls._index(row)
+
+            cls._loaded_at = time.monotonic()
+
+    @classmethod
+    def _ensure_fresh(cls):
+        if (
+            cls._loaded_at is None
+            or time.monotonic() - cls._loaded_at > SYMBOLS_CACHE_TTL
+        ):
+            cls.load()
+
+    @classmethod
+    def invalidate(cls):
+        with cls._lock:
+            cls._loaded_at = None
+
+    @classmethod
+    def refresh(cls, query_key: str):
+        """Re-reads one symbol, e.g. after its priority changed"""
+        with Database.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT * FROM symbols WHERE query_key = %s", (query_key,)
+                )
+                row = cursor.fetchone()
+
+        if row is not None:
+            with cls._lock:
+                cls._index(row)
+
+        return row
+
+    @classmethod
+    def get(cls, query_key: str) -> tuple | None:
+        cls._ensure_fresh()
+        row = cls._by_query_key.get(query_key)
+
+        # Listed after the last bulk load
+        if row is None:
+            row = cls.refresh(query_key)
+
+        return row
+
+    @classmethod
+    def get_by_fetch_key(cls, fetch_key: str) -> tuple | None:
+        cls._ensure_fresh()
+        return cls._by_fetch_key.get(fetch_key)
+
+    @classmethod
+    def get_by_exchange_token(cls, exchange_token: str | int) -> tuple | None:
+        cls._ensure_fresh()
+        return cls._by_exchange_token.get(str(exchange_token))
@@ -1,11 +1,15 @@
-from .topics import Topics
+from .topics import Topics, FEED_PARTITIONS, partition_for
 from .main import Kafka
 from .typelist import Timeframe, SignalAction, SignalType, OrderType, FillType
 from .models import DataEvent, Signal, SignalEvent
+from .producer import SharedProducer, get_producer
+from .codec import encode_bar, decode_bar, encode_signal, decode_signal
 
 __all__ = [
     "Kafka",
     "Topics",
+    "FEED_PARTITIONS",
+    "partition_for",
     "DataEvent",
     "Signal",
     "SignalEvent",
@@ -14,4 +18,10 @@ __all__ = [
     "SignalType",
     "OrderType",
     "FillType",
+    "SharedProducer",
+    "get_producer",
+    "encode_bar",
+    "decode_bar",
+    "encode_signal",
+    "decode_signal",
 ]
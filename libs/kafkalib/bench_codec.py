@@ -0,0 +1,88 @@
+"""
+Compares the JSON and binary wire formats for bars and signals.
+
+    uv run bench_codec.py [iterations]
+
+Prints bytes per message and encode/decode nanoseconds per message.
+"""
+
+import os
+import sys
+import json
+import time
+
+# The codec doesn't talk to Kafka, but importing kafkalib builds the app
+os.environ.setdefault("KAFKA_BROKER_ADDRESS", "localhost:9092")
+
+from kafkalib.models import SignalEvent  # noqa: E402
+from kafkalib.codec import (  # noqa: E402
+    encode_bar,
+    decode_bar,
+    encode_signal,
+    decode_signal,
+)
+
+BAR = {
+    "ticker": "TATASTEEL.NSE",
+    "ts": "2025-01-02T09:15:00+05:30",
+    "open": 140.15,
+    "high": 140.6,
+    "low": 139.95,
+    "close": 140.4,
+    "volume": 123456,
+    "oi": 0.0,
+}
+
+SIGNAL = SignalEvent(
+    strategy="strategy_0",
+    ticker="TATASTEEL.NSE",
+    quantity=10,
+    action="BUY",
+    type="ENTRY",
+    order_type="LIMIT",
+    limit_price=140.4,
+    sl=0.01,
+    tp=0.02,
+)
+
+
+def measure(fn, arg, iterations: int) -> float:
+    started = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn(arg)
+
+    return (time.perf_counter_ns() - started) / iterations
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+
+    cases = [
+        (
+            "bar/json",
+            lambda bar: json.dumps(bar).encode("utf-8"),
+            json.loads,
+            BAR,
+        ),
+        ("bar/binary", encode_bar, decode_bar, BAR),
+        (
+            "signal/json",
+            lambda signal: json.dumps(signal.model_dump()).encode("utf-8"),
+            lambda data: SignalEvent.model_validate(json.loads(data)),
+            SIGNAL,
+        ),
+        ("signal/binary", encode_signal, decode_signal, SIGNAL),
+    ]
+
+    print(f"{'format':<16}{'bytes':>8}{'encode ns':>12}{'decode ns':>12}")
+
+    for name, encode, decode, message in cases:
+        payload = encode(message)
+        encode_ns = measure(encode, message, iterations)
+        decode_ns = measure(decode, payload, iterations)
+
+        print(f"{name:<16}{len(payload):>8}{encode_ns:>12.0f}{decode_ns:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
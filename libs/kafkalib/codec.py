@@ -0,0 +1,251 @@
+"""
+Binary wire format for feed bars and signals.
+
+Every message starts with a magic byte and a schema id, followed by a
+fixed little-endian struct and length-prefixed UTF-8 strings. JSON payloads
+from older producers start with "{", so decoders fall back to them.
+"""
+
+import os
+import json
+import struct
+import numbers
+from datetime import datetime, timedelta, timezone
+from typing import Any, get_args
+from kafkalib.typelist import SignalAction, SignalType, OrderType, FillType
+from kafkalib.models import DataEvent, SignalEvent
+
+# "binary" or "json", lets consumers be upgraded before producers
+KAFKA_WIRE_FORMAT = os.getenv("KAFKA_WIRE_FORMAT", "binary")
+
+MAGIC = 0
+
+# Schema registry stand-in, ids are never reused
+BAR_V1 = 1
+SIGNAL_V1 = 2
+
+SCHEMAS = {
+    BAR_V1: "bar.v1",
+    SIGNAL_V1: "signal.v1",
+}
+
+HEADER = struct.Struct("<BB")
+STRING_LEN = struct.Struct("<H")
+
+# ts (epoch ns), open, high, low, close, volume, oi
+BAR_BODY = struct.Struct("<qddddqd")
+
+# ts (epoch ns), quantity, limit_price, sl, tp, action, type, order_type,
+# fill_type, presence flags
+SIGNAL_BODY = struct.Struct("<qddddBBBBB")
+
+# Codes are positions in the Literal types, new values must be appended
+ACTIONS = get_args(SignalAction)
+SIGNAL_TYPES = get_args(SignalType)
+ORDER_TYPES = get_args(OrderType)
+FILL_TYPES = get_args(FillType)
+
+HAS_LIMIT_PRICE = 1
+HAS_SL = 1 << 1
+HAS_TP = 1 << 2
+HAS_POSITION = 1 << 3
+HAS_FILL_TYPE = 1 << 4
+TS_AWARE = 1 << 5
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def to_epoch_ns(ts: Any) -> int:
+    """Epoch nanoseconds for an integer, ISO string or datetime, naive values are rejected"""
+    # numpy integers included, e.g. timestamps read from bar arrays
+    if isinstance(ts, numbers.Integral):
+        return int(ts)
+
+    # pandas Timestamps carry exact nanoseconds
+    value = getattr(ts, "value", None)
+    if isinstance(value, int) and getattr(ts, "tzinfo", None) is not None:
+        return value
+
+    if isinstance(ts, str):
+        ts = datetime.fromisoformat(ts)
+
+    # Consumers would each have to guess the zone of a naive value
+    if ts.tzinfo is None:
+        raise ValueError(f"Timestamp {ts} has no time zone")
+
+    return (ts - EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def from_epoch_ns(ns: int, aware: bool = True) -> datetime:
+    ts = EPOCH + timedelta(microseconds=ns // 1000)
+    return ts if aware else ts.replace(tzinfo=None)
+
+
+def _pack_string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return STRING_LEN.pack(len(data)) + data
+
+
+def _unpack_string(data: bytes, offset: int) -> tuple[str, int]:
+    (length,) = STRING_LEN.unpack_from(data, offset)
+    offset += STRING_LEN.size
+
+    return data[offset : offset + length].decode("utf-8"), offset + length
+
+
+def schema_of(data: bytes) -> int | None:
+    """Schema id of a binary message, None for legacy JSON"""
+    if len(data) >= HEADER.size and data[0] == MAGIC:
+        return data[1]
+
+    return None
+
+
+def encode_bar(bar: dict | DataEvent) -> bytes:
+    if isinstance(bar, DataEvent):
+        bar = bar.model_dump()
+
+    ts = to_epoch_ns(bar["ts"])
+
+    if KAFKA_WIRE_FORMAT == "json":
+        message = dict(bar)
+        if isinstance(message["ts"], datetime):
+            message["ts"] = message["ts"].isoformat()
+
+        return json.dumps(message).encode("utf-8")
+
+    return (
+        HEADER.pack(MAGIC, BAR_V1)
+        + BAR_BODY.pack(
+            ts,
+            float(bar["open"]),
+            float(bar["high"]),
+            float(bar["low"]),
+            float(bar["close"]),
+            int(bar["volume"]),
+            float(bar.get("oi") or 0),
+        )
+        + _pack_string(bar["ticker"])
+    )
+
+
+def decode_bar(data: bytes) -> dict:
+    """
+    Decodes a feed bar into a dict with `ts` as epoch nanoseconds (UTC),
+    whether it was sent as binary or as legacy JSON.
+    """
+    schema = schema_of(data)
+
+    if schema is None:
+        bar = json.loads(data)
+        bar["ts"] = to_epoch_ns(bar["ts"])
+        return bar
+
+    if schema != BAR_V1:
+        raise ValueError(f"Unexpected schema {SCHEMAS.get(schema, schema)} for a bar")
+
+    ts, open, high, low, close, volume, oi = BAR_BODY.unpack_from(data, HEADER.size)
+    ticker, _ = _unpack_string(data, HEADER.size + BAR_BODY.size)
+
+    return {
+        "ticker": ticker,
+        "ts": ts,
+        "open": open,
+        "high": high,
+        "low": low,
+        "close": close,
+        "volume": volume,
+        "oi": oi,
+    }
+
+
+def encode_signal(signal: SignalEvent) -> bytes:
+    if KAFKA_WIRE_FORMAT == "json":
+        return json.dumps(signal.model_dump()).encode("utf-8")
+
+    ts = datetime.fromisoformat(signal.ts)
+    flags = TS_AWARE
+
+    # Naive signal times round trip as their wall clock, flagged as naive
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+        flags = 0
+
+    if signal.limit_price is not None:
+        flags |= HAS_LIMIT_PRICE
+    if signal.sl is not None:
+        flags |= HAS_SL
+    if signal.tp is not None:
+        flags |= HAS_TP
+    if signal.position is not None:
+        flags |= HAS_POSITION
+    if signal.fill_type is not None:
+        flags |= HAS_FILL_TYPE
+
+    body = SIGNAL_BODY.pack(
+        to_epoch_ns(ts),
+        float(signal.quantity),
+        signal.limit_price or 0.0,
+        signal.sl or 0.0,
+        signal.tp or 0.0,
+        ACTIONS.index(signal.action),
+        SIGNAL_TYPES.index(signal.type),
+        ORDER_TYPES.index(signal.order_type),
+        FILL_TYPES.index(signal.fill_type) if signal.fill_type else 0,
+        flags,
+    )
+
+    strings = _pack_string(signal.strategy) + _pack_string(signal.ticker)
+    if signal.position is not None:
+        strings += _pack_string(signal.position)
+
+    return HEADER.pack(MAGIC, SIGNAL_V1) + body + strings
+
+
+def decode_signal(data: bytes) -> SignalEvent:
+    schema = schema_of(data)
+
+    if schema is None:
+        return SignalEvent.model_validate(json.loads(data))
+
+    if schema != SIGNAL_V1:
+        raise ValueError(
+            f"Unexpected schema {SCHEMAS.get(schema, schema)} for a signal"
+        )
+
+    (
+        ts,
+        quantity,
+        limit_price,
+        sl,
+        tp,
+        action,
+        signal_type,
+        order_type,
+        fill_type,
+        flags,
+    ) = SIGNAL_BODY.unpack_from(data, HEADER.size)
+
+    offset = HEADER.size + SIGNAL_BODY.size
+    strategy, offset = _unpack_string(data, offset)
+    ticker, offset = _unpack_string(data, offset)
+    position = None
+    if flags & HAS_POSITION:
+        position, offset = _unpack_string(data, offset)
+
+    return SignalEvent.model_validate(
+        {
+            "strategy": strategy,
+            "ticker": ticker,
+            "ts": from_epoch_ns(ts, aware=bool(flags & TS_AWARE)).isoformat(),
+            "quantity": quantity,
+            "action": ACTIONS[action],
+            "type": SIGNAL_TYPES[signal_type],
+            "order_type": ORDER_TYPES[order_type],
+            "fill_type": FILL_TYPES[fill_type] if flags & HAS_FILL_TYPE else None,
+            "position": position,
+            "limit_price": limit_price if flags & HAS_LIMIT_PRICE else None,
+            "sl": sl if flags & HAS_SL else None,
+            "tp": tp if flags & HAS_TP else None,
+        }
+    )
@@ -1,6 +1,11 @@
-from setup import app
-from topics import Topics
-from typelist import Timeframe
+import logging
+from confluent_kafka.admin import AdminClient, NewTopic, NewPartitions
+from quixstreams.kafka import Consumer
+from kafkalib.setup import app, broker_address
+from kafkalib.topics import Topics, FEED_TOPICS
+from kafkalib.typelist import Timeframe
+
+logger = logging.getLogger("kafkalib")
 
 
 class Kafka:
@@ -23,3 +28,57 @@ class Kafka:
         }
 
         return topics_match[tf]
+
+    def ensure_topics(self, timeout: float = 30):
+        """
+        Creates missing feed topics with their configured partition count and
+        grows existing ones that have fewer. Partitions are never removed.
+        """
+        admin = AdminClient({"bootstrap.servers": broker_address})
+        existing = admin.list_topics(timeout=timeout).topics
+
+        create, grow = [], []
+        for member in FEED_TOPICS:
+            topic = member.value
+            config = topic.create_config
+
+            if topic.name not in existing:
+                create.append(
+                    NewTopic(
+                        topic.name,
+                        num_partitions=config.num_partitions,
+                        replication_factor=config.replication_factor,
+                    )
+                )
+            elif len(existing[topic.name].partitions) < config.num_partitions:
+                grow.append(NewPartitions(topic.name, config.num_partitions))
+
+        futures = {}
+        if create:
+            futures.update(admin.create_topics(create, request_timeout=timeout))
+        if grow:
+            futures.update(admin.create_partitions(grow, request_timeout=timeout))
+
+        for name, future in futures.items():
+            future.result()
+            logger.info("Feed topic %s has its configured partitions", name)
+
+    def get_consumer(
+        self,
+        group_id: str,
+        auto_offset_reset: str = "latest",
+        extra_config: dict | None = None,
+        auto_commit_enable: bool = True,
+    ) -> Consumer:
+        """
+        Consumer in its own group, workers sharing `group_id` split the partitions.
+        Auto commit may commit a batch before it's processed, so it's lost if the
+        consumer fails; disable it and commit after processing to consume it again.
+        """
+        return Consumer(
+            broker_address=broker_address,  # type: ignore
+            consumer_group=group_id,
+            auto_offset_reset=auto_offset_reset,  # type: ignore
+            auto_commit_enable=auto_commit_enable,
+            extra_config=extra_config,
+        )
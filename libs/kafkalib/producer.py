@@ -0,0 +1,141 @@
+import os
+import atexit
+import logging
+import threading
+from typing import Any, Callable, Optional
+from quixstreams.kafka import Producer
+from kafkalib.setup import broker_address
+
+KAFKA_LINGER_MS = int(os.getenv("KAFKA_LINGER_MS", "5"))
+KAFKA_BATCH_SIZE = int(os.getenv("KAFKA_BATCH_SIZE", str(256 * 1024)))
+KAFKA_COMPRESSION = os.getenv("KAFKA_COMPRESSION", "lz4")
+KAFKA_FLUSH_TIMEOUT = float(os.getenv("KAFKA_FLUSH_TIMEOUT", "10"))
+
+# Called with (error, message) from librdkafka's delivery report
+DeliveryCallback = Callable[[Optional[Any], Any], None]
+
+logger = logging.getLogger("kafkalib.producer")
+
+
+class SharedProducer:
+    """
+    One librdkafka producer per process, shared by every caller. Produce
+    only enqueues; messages are batched by linger/batch size and delivery
+    reports are served on each call. A forked child gets its own handle.
+    """
+
+    def __init__(
+        self,
+        linger_ms: int = KAFKA_LINGER_MS,
+        batch_size: int = KAFKA_BATCH_SIZE,
+        compression: str = KAFKA_COMPRESSION,
+        extra_config: dict | None = None,
+    ):
+        self.config = {
+            # librdkafka retries failed sends itself, idempotence keeps
+            # those retries from duplicating or reordering messages
+            "enable.idempotence": True,
+            "linger.ms": linger_ms,
+            "batch.size": batch_size,
+            "compression.type": compression,
+            **(extra_config or {}),
+        }
+
+        self.delivered = 0
+        self.failed = 0
+
+        self._producer: Producer | None = None
+        self._pid: int | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def producer(self) -> Producer:
+        if self._producer is None or self._pid != os.getpid():
+            with self._lock:
+                if self._producer is None or self._pid != os.getpid():
+                    self._producer = Producer(
+                        broker_address=broker_address,  # type: ignore
+                        extra_config=self.config,
+                    )
+                    self._pid = os.getpid()
+
+        return self._producer
+
+    def _on_delivery(self, callback: DeliveryCallback | None) -> DeliveryCallback:
+        def on_delivery(error, message):
+            if error is None:
+                self.delivered += 1
+            else:
+                self.failed += 1
+                logger.error(
+                    "Delivery to %s failed for key %s: %s",
+                    message.topic(),
+                    message.key(),
+                    error.str(),
+                )
+
+            if callback is not None:
+                callback(error, message)
+
+        return on_delivery
+
+    def produce(
+        self,
+        topic: str,
+        value: bytes,
+        key: bytes | str | None = None,
+        partition: int | None = None,
+        on_delivery: DeliveryCallback | None = None,
+    ):
+        producer = self.producer
+        message = {
+            "topic": topic,
+            "value": value,
+            "key": key,
+            "partition": partition,
+            "on_delivery": self._on_delivery(on_delivery),
+        }
+
+        try:
+            producer.produce(**message)
+        except BufferError:
+            # Local queue is full, wait for deliveries to free it up once
+            producer.poll(KAFKA_FLUSH_TIMEOUT)
+            producer.produce(**message)
+
+        # Serves delivery reports of earlier messages without blocking
+        producer.poll(0)
+
+    def poll(self, timeout: float = 0) -> int:
+        if self._producer is None:
+            return 0
+
+        return self._producer.poll(timeout)
+
+    def flush(self, timeout: float = KAFKA_FLUSH_TIMEOUT) -> int:
+        """Waits for queued messages, returns how many are still undelivered"""
+        if self._producer is None or self._pid != os.getpid():
+            return 0
+
+        remaining = self._producer.flush(timeout)
+        if remaining:
+            logger.warning("%d messages still queued after flush", remaining)
+
+        return remaining
+
+
+_shared: SharedProducer | None = None
+_shared_lock = threading.Lock()
+
+
+def get_producer() -> SharedProducer:
+    """Process-wide producer, flushed when the interpreter exits"""
+    global _shared
+
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                _shared = SharedProducer()
+                atexit.register(_shared.flush)
+
+    return _shared
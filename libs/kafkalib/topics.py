@@ -1,5 +1,18 @@
+import os
+import zlib
 from enum import Enum
-from setup import app
+from quixstreams.models.topics import TopicConfig
+from kafkalib.setup import app
+
+# Feed topics are keyed by ticker, partitions bound how many strategy
+# workers of one group can share a timeframe
+FEED_PARTITIONS = int(os.getenv("FEED_PARTITIONS", "12"))
+KAFKA_REPLICATION_FACTOR = int(os.getenv("KAFKA_REPLICATION_FACTOR", "1"))
+
+feed_config = TopicConfig(
+    num_partitions=FEED_PARTITIONS,
+    replication_factor=KAFKA_REPLICATION_FACTOR,
+)
 
 
 class DataFeedTopics(str, Enum):
@@ -16,16 +29,70 @@ class DataFeedTopics(str, Enum):
 
 
 class Topics(Enum):
-    FEED_RAW = app.topic(name=DataFeedTopics.FEED_RAW.value, value_deserializer="json")
-    FEED_1M = app.topic(name=DataFeedTopics.FEED_1M.value, value_deserializer="json")
-    FEED_2M = app.topic(name=DataFeedTopics.FEED_2M.value, value_deserializer="json")
-    FEED_3M = app.topic(name=DataFeedTopics.FEED_3M.value, value_deserializer="json")
-    FEED_5M = app.topic(name=DataFeedTopics.FEED_5M.value, value_deserializer="json")
-    FEED_10M = app.topic(name=DataFeedTopics.FEED_10M.value, value_deserializer="json")
-    FEED_15M = app.topic(name=DataFeedTopics.FEED_15M.value, value_deserializer="json")
-    FEED_30M = app.topic(name=DataFeedTopics.FEED_30M.value, value_deserializer="json")
-    FEED_1H = app.topic(name=DataFeedTopics.FEED_1H.value, value_deserializer="json")
-    FEED_4H = app.topic(name=DataFeedTopics.FEED_4H.value, value_deserializer="json")
+    FEED_RAW = app.topic(
+        name=DataFeedTopics.FEED_RAW.value,
+        value_deserializer="json",
+        config=feed_config,
+    )
+    FEED_1M = app.topic(
+        name=DataFeedTopics.FEED_1M.value,
+        value_deserializer="json",
+        config=feed_config,
+    )
+    FEED_2M = app.topic(
+        name=DataFeedTopics.FEED_2M.value,
+        value_deserializer="json",
+        config=feed_config,
+    )
+    FEED_3M = app.topic(
+        name=DataFeedTopics.FEED_3M.value,
+        value_deserializer="json",
+        config=feed_config,
+    )
+    FEED_5M = app.topic(
+        name=DataFeedTopics.FEED_5M.value,
+        value_deserializer="json",
+        config=feed_config,
+    )
+    FEED_10M = app.topic(
+        name=DataFeedTopics.FEED_10M.value,
+        value_deserializer="json",
+        config=feed_config,
+    )
+    FEED_15M = app.topic(
+        name=DataFeedTopics.FEED_15M.value,
+        value_deserializer="json",
+        config=feed_config,
+    )
+    FEED_30M = app.topic(
+        name=DataFeedTopics.FEED_30M.value,
+        value_deserializer="json",
+        config=feed_config,
+    )
+    FEED_1H = app.topic(
+        name=DataFeedTopics.FEED_1H.value,
+        value_deserializer="json",
+        config=feed_config,
+    )
+    FEED_4H = app.topic(
+        name=DataFeedTopics.FEED_4H.value,
+        value_deserializer="json",
+        config=feed_config,
+    )
 
     SIGNALS = app.topic(name="signals", value_deserializer="json")
     ORDERS = app.topic(name="orders", value_deserializer="json")
+
+
+FEED_TOPICS = [topic for topic in Topics if topic.name.startswith("FEED_")]
+
+
+def partition_for(key: str | bytes, partitions: int = FEED_PARTITIONS) -> int:
+    """
+    Partition of a ticker on the feed topics. Producers set it explicitly so
+    every client agrees on it, whatever their default partitioner is.
+    """
+    if isinstance(key, str):
+        key = key.encode("utf-8")
+
+    return zlib.crc32(key) % partitions
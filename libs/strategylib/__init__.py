@@ -1,9 +1,27 @@
 from .main import StrategyBuilder, StrategyConfig, Timeframe, Signal, SignalEvent
+from .host import StrategyHost
+from .bar_buffer import Bars
+from .indicators import Indicator, EMA, SMA, RSI, ATR, VWAP, Bollinger
+from .backtest import Backtest, BacktestResult, run_backtest
+from .sweep import Sweep
 
 __all__ = [
     "StrategyBuilder",
     "StrategyConfig",
+    "StrategyHost",
     "Timeframe",
     "Signal",
     "SignalEvent",
+    "Bars",
+    "Indicator",
+    "EMA",
+    "SMA",
+    "RSI",
+    "ATR",
+    "VWAP",
+    "Bollinger",
+    "Backtest",
+    "BacktestResult",
+    "run_backtest",
+    "Sweep",
 ]
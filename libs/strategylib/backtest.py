@@ -0,0 +1,375 @@
+import numpy as np
+import pandas as pd
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pandas import DataFrame
+from typing import Callable, Dict, Optional
+
+from datastore import DataStore
+from kafkalib import Signal, Timeframe
+from .bar_buffer import BAR_COLUMNS, DEFAULT_LOOKBACK
+from .data_builder import DataBuilder
+from .indicators import Indicator, IndicatorSet, OPEN, HIGH, LOW, CLOSE
+
+# (ts, values) per ticker, laid out like BarBuffer.view
+BarArrays = Dict[str, tuple[np.ndarray, np.ndarray]]
+
+ds = DataStore()
+
+SESSION_CLOSE = pd.Timedelta(hours=15, minutes=30)
+
+
+@dataclass
+class Position:
+    ticker: str
+    action: str
+    quantity: float
+    entry_ts: int
+    entry_price: float
+    sl_price: float | None = None
+    tp_price: float | None = None
+
+
+@dataclass
+class PendingOrder:
+    ticker: str
+    signal: Signal
+    placed_ts: int
+    position: Position | None = None
+    # DAY validity, resting orders expire at the close of their session
+    expires_ts: int | None = None
+
+
+@dataclass
+class BacktestResult:
+    trades: DataFrame
+    equity: pd.Series
+    capital: float
+    params: dict = field(default_factory=dict)
+
+    @property
+    def pnl(self) -> float:
+        return float(self.trades["pnl"].sum()) if not self.trades.empty else 0.0
+
+    def summary(self) -> dict:
+        peak = self.equity.cummax()
+        drawdown = ((self.equity - peak) / peak).min() if not self.equity.empty else 0.0
+        wins = int((self.trades["pnl"] > 0).sum()) if not self.trades.empty else 0
+
+        return {
+            **self.params,
+            "pnl": self.pnl,
+            "return_pct": 100 * self.pnl / self.capital if self.capital else 0.0,
+            "trades": len(self.trades),
+            "win_rate": 100 * wins / len(self.trades) if len(self.trades) else 0.0,
+            "max_drawdown_pct": 100 * float(drawdown),
+        }
+
+
+def frame_to_arrays(df: DataFrame) -> tuple[np.ndarray, np.ndarray]:
+    index = pd.DatetimeIndex(df.index)
+    values = np.vstack(
+        [
+            df[column].to_numpy(dtype="float64")
+            if column in df.columns
+            else np.zeros(len(df), dtype="float64")
+            for column in BAR_COLUMNS
+        ]
+    )
+    return index.as_unit("ns").asi8, values
+
+
+def _stop_price(action: str, order_type: str, trigger: float, bar: np.ndarray):
+    """Fill price of a LIMIT/SL/SL-M order on this bar, None if it isn't hit"""
+    if order_type == "LIMIT":
+        if action == "BUY" and bar[LOW] <= trigger:
+            return min(bar[OPEN], trigger)
+        if action == "SELL" and bar[HIGH] >= trigger:
+            return max(bar[OPEN], trigger)
+
+    elif order_type in ("SL", "SL-M"):
+        if action == "BUY" and bar[HIGH] >= trigger:
+            return max(bar[OPEN], trigger)
+        if action == "SELL" and bar[LOW] <= trigger:
+            return min(bar[OPEN], trigger)
+
+    return None
+
+
+def run_backtest(
+    strategy: Callable,
+    bars: BarArrays,
+    capital: float = 100000.0,
+    data_format: str = "pandas",
+    indicators: Optional[Dict[str, Indicator]] = None,
+    max_lookback: int = DEFAULT_LOOKBACK,
+    tz: str = "Asia/Kolkata",
+) -> BacktestResult:
+    """
+    Replays bars of all tickers in timestamp order through `strategy`,
+    mirroring orders_management: market orders fill at the next bar's open,
+    LIMIT/SL orders rest until the session close and need a `limit_price`
+    as their price or trigger, entries need enough remaining capital,
+    `sl`/`tp` are fractions of the entry price and EXIT closes every open
+    position of the strategy.
+
+    The "numpy" data format is the fast path, "pandas" builds a DataFrame
+    for every bar and is much slower over long ranges.
+    """
+    tickers = list(bars.keys())
+    store = DataBuilder(tickers, max_lookback=max_lookback, tz=tz)
+    indicator_sets = {tick: IndicatorSet(indicators or {}) for tick in tickers}
+
+    # Merge all tickers into one event stream ordered by ts
+    ticker_idx = np.concatenate(
+        [np.full(len(bars[tick][0]), idx) for idx, tick in enumerate(tickers)]
+    )
+    row_idx = np.concatenate([np.arange(len(bars[tick][0])) for tick in tickers])
+    all_ts = np.concatenate([bars[tick][0] for tick in tickers])
+    order = np.argsort(all_ts, kind="stable")
+
+    cash = capital
+    positions: list[Position] = []
+    # Orders waiting for a later bar, per ticker
+    pending: dict[str, list[PendingOrder]] = defaultdict(list)
+    trades: list[dict] = []
+    last_close: dict[str, float] = {}
+    equity_ts: list[int] = []
+    equity: list[float] = []
+
+    def session_close(ts: int) -> int:
+        day = pd.Timestamp(ts, tz="UTC").tz_convert(tz).normalize()
+        return (day + SESSION_CLOSE).value
+
+    def close_position(pos: Position, ts: int, price: float, reason: str):
+        nonlocal cash
+        direction = 1 if pos.action == "BUY" else -1
+        pnl = direction * (price - pos.entry_price) * pos.quantity
+        cash += pos.entry_price * pos.quantity + pnl
+        positions.remove(pos)
+        trades.append(
+            {
+                "ticker": pos.ticker,
+                "action": pos.action,
+                "quantity": pos.quantity,
+                "entry_ts": pos.entry_ts,
+                "entry_price": pos.entry_price,
+                "exit_ts": ts,
+                "exit_price": price,
+                "exit_reason": reason,
+                "pnl": pnl,
+            }
+        )
+
+    for event in order:
+        tick = tickers[ticker_idx[event]]
+        ts_arr, values_arr = bars[tick]
+        row = row_idx[event]
+        ts = int(ts_arr[row])
+        bar = values_arr[:, row]
+
+        # 1. Orders placed on earlier bars
+        for pending_order in list(pending[tick]):
+            signal = pending_order.signal
+
+            if pending_order.position is not None:
+                if pending_order.position in positions:
+                    close_position(pending_order.position, ts, bar[OPEN], "EXIT")
+                pending[tick].remove(pending_order)
+                continue
+
+            if signal.order_type == "MARKET":
+                price = bar[OPEN]
+            else:
+                if ts >= pending_order.expires_ts:  # type: ignore
+                    pending[tick].remove(pending_order)
+                    continue
+                price = _stop_price(
+                    signal.action,
+                    signal.order_type,
+                    signal.limit_price,  # type: ignore
+                    bar,
+                )
+                if price is None:
+                    continue
+
+            pending[tick].remove(pending_order)
+            required = signal.quantity * price
+            if cash <= 0 or cash < required:
+                continue
+
+            cash -= required
+            direction = 1 if signal.action == "BUY" else -1
+            positions.append(
+                Position(
+                    ticker=tick,
+                    action=signal.action,
+                    quantity=signal.quantity,
+                    entry_ts=ts,
+                    entry_price=price,
+                    sl_price=price * (1 - direction * signal.sl) if signal.sl else None,
+                    tp_price=price * (1 + direction * signal.tp) if signal.tp else None,
+                )
+            )
+
+        # 2. Stop loss and target orders of open positions
+        for pos in [p for p in positions if p.ticker == tick]:
+            exit_action = "SELL" if pos.action == "BUY" else "BUY"
+
+            if pos.sl_price is not None:
+                price = _stop_price(exit_action, "SL-M", pos.sl_price, bar)
+                if price is not None:
+                    close_position(pos, ts, price, "SL")
+                    continue
+
+            if pos.tp_price is not None:
+                price = _stop_price(exit_action, "LIMIT", pos.tp_price, bar)
+                if price is not None:
+                    close_position(pos, ts, price, "TP")
+
+        # 3. Strategy evaluation on the closed bar
+        store.data[tick].append(ts, bar)
+        indicator_sets[tick].update(ts, bar.tolist())
+        last_close[tick] = bar[CLOSE]
+
+        latest = indicator_sets[tick].latest
+        if data_format == "numpy":
+            signals = strategy(store.get_data(tick, latest))
+        else:
+            signals = strategy(store.get_frame(tick, latest))
+
+        if isinstance(signals, Signal):
+            signals = [signals]
+
+        for signal in signals or []:
+            if signal.type == "ENTRY":
+                if signal.order_type != "MARKET" and signal.limit_price is None:
+                    raise ValueError(
+                        f"{signal.order_type} signal for {tick} needs a limit_price"
+                    )
+
+                pending[tick].append(
+                    PendingOrder(
+                        ticker=tick,
+                        signal=signal,
+                        placed_ts=ts,
+                        expires_ts=session_close(ts),
+                    )
+                )
+
+            elif signal.type == "EXIT":
+                for pos in positions:
+                    # Repeated EXITs don't queue a second close
+                    if any(o.position is pos for o in pending[pos.ticker]):
+                        continue
+
+                    pending[pos.ticker].append(
+                        PendingOrder(
+                            ticker=pos.ticker,
+                            signal=signal,
+                            placed_ts=ts,
+                            position=pos,
+                        )
+                    )
+
+        # 4. Mark to market
+        open_value = sum(
+            pos.entry_price * pos.quantity
+            + (1 if pos.action == "BUY" else -1)
+            * (last_close[pos.ticker] - pos.entry_price)
+            * pos.quantity
+            for pos in positions
+        )
+        equity_ts.append(ts)
+        equity.append(cash + open_value)
+
+    for pos in list(positions):
+        close_position(pos, int(bars[pos.ticker][0][-1]), last_close[pos.ticker], "END")
+
+    trades_df = DataFrame(
+        trades,
+        columns=[
+            "ticker",
+            "action",
+            "quantity",
+            "entry_ts",
+            "entry_price",
+            "exit_ts",
+            "exit_price",
+            "exit_reason",
+            "pnl",
+        ],
+    )
+    for column in ("entry_ts", "exit_ts"):
+        trades_df[column] = pd.to_datetime(
+            trades_df[column].astype("int64"), utc=True
+        ).dt.tz_convert(tz)
+
+    equity_series = pd.Series(
+        equity,
+        index=pd.to_datetime(np.asarray(equity_ts, dtype="int64"), utc=True).tz_convert(
+            tz
+        ),
+        name="equity",
+    )
+    equity_series = equity_series[~equity_series.index.duplicated(keep="last")]
+
+    return BacktestResult(trades=trades_df, equity=equity_series, capital=capital)
+
+
+class Backtest:
+    def __init__(
+        self,
+        strategy: Callable,
+        tickers: str | list[str],
+        run_tf: Timeframe,
+        start_date: str,
+        end_date: str,
+        capital: float = 100000.0,
+        data_format: str = "pandas",
+        indicators: Optional[Dict[str, Indicator]] = None,
+        max_lookback: int = DEFAULT_LOOKBACK,
+        tz: str = "Asia/Kolkata",
+    ):
+        if isinstance(tickers, str):
+            tickers = [tickers]
+
+        self.strategy = strategy
+        self.tickers = tickers
+        self.run_tf = run_tf
+        self.start_date = start_date
+        self.end_date = end_date
+        self.capital = capital
+        self.data_format = data_format
+        self.indicators = indicators
+        self.max_lookback = max_lookback
+        self.tz = tz
+
+    def load(self) -> BarArrays:
+        bars = {}
+
+        for tick in self.tickers:
+            df = ds.get_historic_data(
+                ticker=tick,
+                freq=self.run_tf,  # type: ignore
+                start_date=self.start_date,
+                end_date=self.end_date,
+                tz=self.tz,
+            )
+            bars[tick] = frame_to_arrays(df)
+
+        return bars
+
+    def run(self, bars: Optional[BarArrays] = None) -> BacktestResult:
+        if bars is None:
+            bars = self.load()
+
+        return run_backtest(
+            self.strategy,
+            bars,
+            capital=self.capital,
+            data_format=self.data_format,
+            indicators=self.indicators,
+            max_lookback=self.max_lookback,
+            tz=self.tz,
+        )
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from pandas import DataFrame
+
+BAR_COLUMNS = ("open", "high", "low", "close", "volume", "oi")
+
+DEFAULT_LOOKBACK = 5000
+
+
+def to_ns(ts: str | int | datetime | pd.Timestamp, tz: str) -> int:
+    """Epoch nanoseconds (UTC) for a bar timestamp, naive values are read as `tz`"""
+    if isinstance(ts, (int, np.integer)):
+        return int(ts)
+
+    stamp = pd.Timestamp(ts)
+    if stamp.tzinfo is None:
+        stamp = stamp.tz_localize(tz)
+
+    return stamp.value
+
+
+class Bars:
+    """
+    Zero-copy view over the most recent bars of a ticker, oldest first.
+
+    Arrays alias the ring buffer, so they're only valid until the next append.
+    """
+
+    def __init__(
+        self,
+        ticker: str,
+        ts: np.ndarray,
+        values: np.ndarray,
+        tz: str,
+        indicators: dict | None = None,
+    ):
+        self.ticker = ticker
+        self.ts = ts
+        self.values = values
+        self.tz = tz
+        # Latest value of every indicator declared on the strategy
+        self.indicators = indicators or {}
+
+    def __len__(self):
+        return len(self.ts)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        if column == "ts":
+            return self.ts
+
+        return self.values[BAR_COLUMNS.index(column)]
+
+    @property
+    def open(self):
+        return self.values[0]
+
+    @property
+    def high(self):
+        return self.values[1]
+
+    @property
+    def low(self):
+        return self.values[2]
+
+    @property
+    def close(self):
+        return self.values[3]
+
+    @property
+    def volume(self):
+        return self.values[4]
+
+    @property
+    def oi(self):
+        return self.values[5]
+
+    def to_frame(self) -> DataFrame:
+        index = pd.DatetimeIndex(
+            pd.to_datetime(self.ts, utc=True).tz_convert(self.tz), name="ts"
+        )
+
+        df = DataFrame(
+            {column: self.values[idx] for idx, column in enumerate(BAR_COLUMNS)},
+            index=index,
+        )
+        df["volume"] = df["volume"].astype("int64")
+        df.attrs["indicators"] = self.indicators
+
+        return df
+
+
+class BarBuffer:
+    """
+    Preallocated circular buffer of bars with O(1) appends.
+
+    Every row is written twice, at `pos` and `pos + capacity`, so the live
+    window is always one contiguous slice and views never need a copy.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_LOOKBACK):
+        if capacity <= 0:
+            raise ValueError("Capacity must be greater than 0")
+
+        self.capacity = capacity
+        self._ts, self._values = self._allocate(2 * capacity)
+        self._start = 0
+        self._size = 0
+
+    def _allocate(self, rows: int) -> tuple[np.ndarray, np.ndarray]:
+        ts = np.zeros(rows, dtype="int64")
+        values = np.zeros((len(BAR_COLUMNS), rows), dtype="float64")
+
+        return ts, values
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def last_ts(self) -> int | None:
+        if self._size == 0:
+            return None
+
+        return int(self._ts[self._start + self._size - 1])
+
+    def append(self, ts: int, values: tuple[float, ...] | list[float] | np.ndarray):
+        if self._size < self.capacity:
+            pos = (self._start + self._size) % self.capacity
+            self._size += 1
+        else:
+            pos = self._start
+            self._start = (self._start + 1) % self.capacity
+
+        self._ts[pos] = ts
+        self._ts[pos + self.capacity] = ts
+        self._values[:, pos] = values
+        self._values[:, pos + self.capacity] = values
+
+    def extend(self, ts: np.ndarray, values: np.ndarray):
+        """Appends rows of `ts`/`values` (shaped like `view`) in one vectorised write"""
+        count = len(ts)
+        if count == 0:
+            return
+
+        if count >= self.capacity:
+            self.load(ts, values)
+            return
+
+        pos = (self._start + self._size + np.arange(count)) % self.capacity
+        self._ts[pos] = ts
+        self._ts[pos + self.capacity] = ts
+        self._values[:, pos] = values
+        self._values[:, pos + self.capacity] = values
+
+        overflow = max(0, self._size + count - self.capacity)
+        self._start = (self._start + overflow) % self.capacity
+        self._size = min(self.capacity, self._size + count)
+
+    def load(self, ts: np.ndarray, values: np.ndarray):
+        """Replaces the buffer contents with the last `capacity` rows of `ts`/`values`"""
+        ts = ts[-self.capacity :]
+        values = values[:, -self.capacity :]
+        size = len(ts)
+
+        self._ts[:size] = ts
+        self._ts[self.capacity : self.capacity + size] = ts
+        self._values[:, :size] = values
+        self._values[:, self.capacity : self.capacity + size] = values
+        self._start = 0
+        self._size = size
+
+    @property
+    def window(self) -> tuple[int, int]:
+        """(start, size) of the live rows, `view` is `[start : start + size]`"""
+        return self._start, self._size
+
+    def view(self) -> tuple[np.ndarray, np.ndarray]:
+        end = self._start + self._size
+        return self._ts[self._start : end], self._values[:, self._start : end]
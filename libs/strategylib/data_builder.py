@@ -1,30 +1,34 @@
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 from typing import Dict
 
+from .bar_buffer import BAR_COLUMNS, DEFAULT_LOOKBACK, BarBuffer, Bars, to_ns
+from .shared import SharedBarBuffer
+
 
 class DataBuilder:
-    def __init__(self, tickers: list[str]):
-        self.tickers = tickers
-        self.data = {}
+    def __init__(
+        self,
+        tickers: list[str],
+        max_lookback: int = DEFAULT_LOOKBACK,
+        tz: str = "Asia/Kolkata",
+        shared: bool = False,
+    ):
+        self.tickers = list(tickers)
+        self.max_lookback = max_lookback
+        self.tz = tz
+        # Shared buffers can be read by worker processes through their handle
+        self.buffer_type = SharedBarBuffer if shared else BarBuffer
+        self.data: dict[str, BarBuffer] = {}
 
         for tick in tickers:
-            columns_with_types = {
-                "ts": pd.Series(dtype="datetime64[ns]"),
-                "open": pd.Series(dtype="float64"),
-                "high": pd.Series(dtype="float64"),
-                "low": pd.Series(dtype="float64"),
-                "close": pd.Series(dtype="float64"),
-                "volume": pd.Series(dtype="int64"),
-                "oi": pd.Series(dtype="int64"),
-            }
-
-            df = pd.DataFrame(columns=list(columns_with_types.keys()))
-            for col, series in columns_with_types.items():
-                df[col] = df[col].astype(series.dtype)
-            df = df.set_index("ts")
-
-            self.data[tick] = df
+            self.data[tick] = self.buffer_type(max_lookback)
+
+    def close(self):
+        for buffer in self.data.values():
+            if isinstance(buffer, SharedBarBuffer):
+                buffer.close()
 
     def init_ticker_data(
         self,
@@ -34,7 +38,20 @@ class DataBuilder:
         if tick not in self.tickers:
             raise ValueError(f"Ticker {tick} not found in data store")
 
-        self.data[tick] = df
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is None:
+            index = index.tz_localize(self.tz)
+
+        values = np.vstack(
+            [
+                df[column].to_numpy(dtype="float64")
+                if column in df.columns
+                else np.zeros(len(df), dtype="float64")
+                for column in BAR_COLUMNS
+            ]
+        )
+
+        self.data[tick].load(index.as_unit("ns").asi8, values)
 
     def add_data(
         self,
@@ -44,16 +61,62 @@ class DataBuilder:
         if tick not in self.data:
             raise ValueError(f"Ticker {tick} not found in data store")
 
-        df = self.data[tick]
-        new_df = pd.DataFrame([data])
-        new_df.set_index("ts", inplace=True)
+        ts = to_ns(data["ts"], self.tz)
+        values = [float(data.get(column) or 0) for column in BAR_COLUMNS]
+        self.data[tick].append(ts, values)
+
+        return ts, values
+
+    def add_many(
+        self,
+        tick: str,
+        data: list[Dict[str, str | int | float]],
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Appends a batch of bars, oldest first, and returns the appended ones
+        as `ts`/`values` arrays. Bars at or before the latest stored one,
+        e.g. replayed after a warm start, are dropped.
+        """
+        if tick not in self.data:
+            raise ValueError(f"Ticker {tick} not found in data store")
+
+        ts = np.fromiter(
+            (to_ns(bar["ts"], self.tz) for bar in data), dtype="int64", count=len(data)
+        )
+        values = np.array(
+            [[float(bar.get(column) or 0) for bar in data] for column in BAR_COLUMNS],
+            dtype="float64",
+        ).reshape(len(BAR_COLUMNS), len(data))
+
+        last_ts = self.data[tick].last_ts
+        floor = np.iinfo("int64").min if last_ts is None else last_ts
+        newest = np.maximum.accumulate(np.concatenate(([floor], ts)))[:-1]
+        keep = ts > newest
+
+        if not keep.all():
+            ts, values = ts[keep], values[:, keep]
+
+        self.data[tick].extend(ts, values)
+
+        return ts, values
+
+    def add_tickers(self, tickers: list[str]):
+        for tick in tickers:
+            if tick not in self.data:
+                self.tickers.append(tick)
+                self.data[tick] = self.buffer_type(self.max_lookback)
+
+    def get_data(
+        self, tick: str, indicators: dict | None = None, lookback: int | None = None
+    ) -> Bars:
+        ts, values = self.data[tick].view()
 
-        if df.empty:
-            df = new_df
-        else:
-            df = pd.concat([df, new_df])
+        if lookback is not None:
+            ts, values = ts[-lookback:], values[:, -lookback:]
 
-        self.data[tick] = df
+        return Bars(tick, ts, values, self.tz, indicators)
 
-    def get_data(self, tick: str):
-        return self.data[tick]
+    def get_frame(
+        self, tick: str, indicators: dict | None = None, lookback: int | None = None
+    ) -> DataFrame:
+        return self.get_data(tick, indicators, lookback).to_frame()
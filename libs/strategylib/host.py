@@ -0,0 +1,188 @@
+from collections import defaultdict
+
+from kafkalib import Kafka, Timeframe, decode_bar
+from .main import (
+    StrategyBuilder,
+    STRATEGY_BATCH_SIZE,
+    STRATEGY_BATCH_LATENCY,
+    preload,
+    seek_to_replay,
+)
+from .data_builder import DataBuilder
+
+kafka = Kafka()
+
+
+class StrategyHost:
+    """
+    Runs many strategies on one feed consumer.
+
+    Every bar is decoded once and appended once to a bar buffer shared per
+    (ticker, timeframe), then handed to each strategy subscribed to it.
+    Strategies keep their own indicators and lookback, so adding one only
+    costs its own compute. History is warm started once per (ticker,
+    timeframe) when the host runs. Strategies are evaluated inline, ones
+    with `workers` are rejected.
+    """
+
+    def __init__(
+        self,
+        strategies: list[StrategyBuilder],
+        group_id: str = "strategy-host",
+    ):
+        self.strategies = strategies
+        self.group_id = group_id
+        self.stores: dict[Timeframe, DataBuilder] = {}
+        # (topic, ticker) -> strategies evaluated on its bars
+        self.routes: dict[tuple[str, str], list[StrategyBuilder]] = defaultdict(list)
+        self._seeked: set[tuple[str, int]] = set()
+
+        for strategy in strategies:
+            self.add(strategy)
+
+    def _store_for(self, tf: Timeframe, lookback: int) -> DataBuilder:
+        store = self.stores.get(tf)
+
+        if store is None or store.max_lookback < lookback:
+            grown = DataBuilder([], max_lookback=lookback)
+
+            if store is not None:
+                grown.add_tickers(store.tickers)
+                for tick, buffer in store.data.items():
+                    grown.data[tick].load(*buffer.view())
+
+                for strategy in self.strategies:
+                    if strategy.store is store:
+                        strategy.store = grown
+
+            store = self.stores[tf] = grown
+
+        return store
+
+    def add(self, strategy: StrategyBuilder):
+        """Moves the strategy's bars into the shared store of its timeframe"""
+        if strategy.workers > 0:
+            raise ValueError(
+                f"{strategy.config.name}: StrategyHost evaluates inline, set workers=0"
+            )
+
+        if strategy not in self.strategies:
+            self.strategies.append(strategy)
+
+        # The host consumes every partition, so it claims all the tickers.
+        # Their history is loaded into the shared store by `warm_start`
+        strategy.claim(strategy.config.tickers, warm=False)
+
+        tf = strategy.config.run_tf
+        store = self._store_for(tf, strategy.max_lookback)
+        store.add_tickers(strategy.config.tickers)  # type: ignore
+
+        topic = kafka.get_feed_topic(tf).name
+
+        if strategy.store is not store:
+            for tick, buffer in strategy.store.data.items():
+                # Keeps whichever side has the longer history, e.g. init_data,
+                # strategies that already saw the other side catch up
+                if len(buffer) > len(store.data[tick]):
+                    store.data[tick].load(*buffer.view())
+
+                    for other in self.routes[(topic, tick)]:
+                        other._replay_indicators(tick)
+
+            strategy.store.close()
+            strategy.store = store
+
+            # Indicators follow the shared bars, not the ones it brought
+            for tick in strategy.config.tickers:
+                strategy._replay_indicators(tick)
+
+        for tick in strategy.config.tickers:
+            self.routes[(topic, tick)].append(strategy)
+
+    def warm_start(self):
+        """Preloads each (timeframe, ticker) once, as deep as its largest warmup"""
+        for tf, store in self.stores.items():
+            strategies = [
+                strategy
+                for strategy in self.strategies
+                if strategy.config.run_tf == tf and strategy.warmup > 0
+            ]
+            if not strategies:
+                continue
+
+            tickers = sorted(
+                {tick for strategy in strategies for tick in strategy.config.tickers}
+            )
+            bars = max(strategy.warmup for strategy in strategies)
+
+            replay_from, loaded = preload(store, tickers, tf, bars, f"StrategyHost {tf}")
+            if replay_from is None:
+                continue
+
+            for strategy in strategies:
+                strategy._replay_from = replay_from
+
+            topic = kafka.get_feed_topic(tf).name
+            for tick in loaded:
+                for strategy in self.routes[(topic, tick)]:
+                    strategy._replay_indicators(tick)
+
+    def _on_assign(self, consumer, partitions):
+        # Each topic replays from the earliest warm start of its strategies
+        replay_from: dict[str, int] = {}
+        for strategy in self.strategies:
+            if strategy._replay_from is None:
+                continue
+
+            topic = kafka.get_feed_topic(strategy.config.run_tf).name
+            replay_from[topic] = min(
+                replay_from.get(topic, strategy._replay_from), strategy._replay_from
+            )
+
+        seek_to_replay(consumer, partitions, replay_from, self._seeked)
+
+    def _group_batch(self, messages) -> dict[tuple[str, str], list[dict]]:
+        batch = defaultdict(list)
+
+        for message in messages:
+            if message.error() is not None:
+                print(f"StrategyHost: {message.error()}")
+                continue
+
+            route = (message.topic(), message.key().decode("utf-8"))
+
+            if route in self.routes:
+                batch[route].append(decode_bar(message.value()))
+
+        return batch
+
+    def run(
+        self,
+        batch_size: int = STRATEGY_BATCH_SIZE,
+        max_batch_latency: float = STRATEGY_BATCH_LATENCY,
+    ):
+        topics = {kafka.get_feed_topic(tf).name: tf for tf in self.stores}
+        self.warm_start()
+
+        with kafka.get_consumer(self.group_id, auto_commit_enable=False) as consumer:
+            consumer.subscribe(list(topics), on_assign=self._on_assign)
+
+            while True:
+                messages = consumer.consume(
+                    num_messages=batch_size, timeout=max_batch_latency
+                )
+
+                if not messages:
+                    continue
+
+                for (topic, tick), bars in self._group_batch(messages).items():
+                    ts, values = self.stores[topics[topic]].add_many(tick, bars)
+                    if len(ts) == 0:
+                        continue
+
+                    for strategy in self.routes[(topic, tick)]:
+                        strategy.indicators[tick].replay(ts, values)
+                        strategy._evaluate(tick)
+
+                # Committed only once the batch is evaluated
+                consumer.commit(asynchronous=False)
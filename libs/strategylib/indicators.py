@@ -0,0 +1,269 @@
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from typing import Sequence
+
+from .bar_buffer import BAR_COLUMNS
+
+OPEN, HIGH, LOW, CLOSE, VOLUME, OI = range(len(BAR_COLUMNS))
+
+IndicatorValue = float | tuple[float, float, float] | None
+
+
+class Indicator(ABC):
+    """
+    Base class for incremental indicators.
+
+    `update` is called once per appended bar with the bar's epoch ns
+    timestamp and its values in BAR_COLUMNS order, and runs in O(1).
+    """
+
+    def __init__(self, **params):
+        self.params = params
+        self.value: IndicatorValue = None
+
+    def spawn(self) -> "Indicator":
+        """Fresh instance with the same parameters, one is kept per ticker"""
+        return type(self)(**self.params)
+
+    @property
+    def ready(self) -> bool:
+        return self.value is not None
+
+    @abstractmethod
+    def update(self, ts: int, bar: Sequence[float]) -> IndicatorValue: ...
+
+
+class SMA(Indicator):
+    def __init__(self, length: int, source: str = "close"):
+        super().__init__(length=length, source=source)
+        self.length = length
+        self.source = BAR_COLUMNS.index(source)
+        self._window: deque[float] = deque()
+        self._sum = 0.0
+
+    def update(self, ts, bar):
+        x = bar[self.source]
+        self._window.append(x)
+        self._sum += x
+
+        if len(self._window) > self.length:
+            self._sum -= self._window.popleft()
+
+        if len(self._window) == self.length:
+            self.value = self._sum / self.length
+
+        return self.value
+
+
+class EMA(Indicator):
+    """EMA seeded with the SMA of the first `length` values, as pandas_ta does"""
+
+    def __init__(self, length: int, source: str = "close"):
+        super().__init__(length=length, source=source)
+        self.length = length
+        self.source = BAR_COLUMNS.index(source)
+        self.alpha = 2 / (length + 1)
+        self._count = 0
+        self._sum = 0.0
+
+    def update(self, ts, bar):
+        x = bar[self.source]
+
+        if self.value is None:
+            self._count += 1
+            self._sum += x
+
+            if self._count == self.length:
+                self.value = self._sum / self.length
+        else:
+            self.value = self.alpha * x + (1 - self.alpha) * self.value
+
+        return self.value
+
+
+class RMA:
+    """Wilder's moving average seeded with an SMA, used by ATR"""
+
+    def __init__(self, length: int):
+        self.length = length
+        self.value: float | None = None
+        self._count = 0
+        self._sum = 0.0
+
+    def update(self, x: float) -> float | None:
+        if self.value is None:
+            self._count += 1
+            self._sum += x
+
+            if self._count == self.length:
+                self.value = self._sum / self.length
+        else:
+            self.value = (self.value * (self.length - 1) + x) / self.length
+
+        return self.value
+
+
+class AdjustedRMA:
+    """
+    Wilder's moving average as pandas_ta computes it, an adjusted
+    `ewm(alpha=1 / length)` that's available from the `length`th value
+    """
+
+    def __init__(self, length: int):
+        self.length = length
+        self.decay = 1 - 1 / length
+        self.value: float | None = None
+        self._count = 0
+        self._num = 0.0
+        self._den = 0.0
+
+    def update(self, x: float) -> float | None:
+        self._count += 1
+        self._num = self._num * self.decay + x
+        self._den = self._den * self.decay + 1
+
+        if self._count >= self.length:
+            self.value = self._num / self._den
+
+        return self.value
+
+
+class RSI(Indicator):
+    """RSI over adjusted Wilder averages, matching pandas_ta's `rsi`"""
+
+    def __init__(self, length: int = 14, source: str = "close"):
+        super().__init__(length=length, source=source)
+        self.source = BAR_COLUMNS.index(source)
+        self._gain = AdjustedRMA(length)
+        self._loss = AdjustedRMA(length)
+        self._prev: float | None = None
+
+    def update(self, ts, bar):
+        x = bar[self.source]
+
+        if self._prev is not None:
+            change = x - self._prev
+            gain = self._gain.update(max(change, 0.0))
+            loss = self._loss.update(max(-change, 0.0))
+
+            if gain is not None and loss is not None:
+                total = gain + loss
+                self.value = 100 * gain / total if total else 50.0
+
+        self._prev = x
+        return self.value
+
+
+class ATR(Indicator):
+    def __init__(self, length: int = 14):
+        super().__init__(length=length)
+        self._rma = RMA(length)
+        self._prev_close: float | None = None
+
+    def update(self, ts, bar):
+        high, low, close = bar[HIGH], bar[LOW], bar[CLOSE]
+
+        if self._prev_close is None:
+            true_range = high - low
+        else:
+            true_range = max(
+                high - low,
+                abs(high - self._prev_close),
+                abs(low - self._prev_close),
+            )
+
+        self._prev_close = close
+        self.value = self._rma.update(true_range)
+        return self.value
+
+
+class VWAP(Indicator):
+    """Session VWAP over the typical price, reset on every new day in `tz`"""
+
+    def __init__(self, tz: str = "Asia/Kolkata"):
+        super().__init__(tz=tz)
+        self.tz = ZoneInfo(tz)
+        self._day = None
+        self._pv = 0.0
+        self._volume = 0.0
+
+    def update(self, ts, bar):
+        day = datetime.fromtimestamp(ts / 1e9, timezone.utc).astimezone(self.tz).date()
+
+        if day != self._day:
+            self._day = day
+            self._pv = 0.0
+            self._volume = 0.0
+
+        typical_price = (bar[HIGH] + bar[LOW] + bar[CLOSE]) / 3
+        self._pv += typical_price * bar[VOLUME]
+        self._volume += bar[VOLUME]
+
+        if self._volume:
+            self.value = self._pv / self._volume
+
+        return self.value
+
+
+class Bollinger(Indicator):
+    """(lower, mid, upper) bands over a rolling sum and sum of squares"""
+
+    def __init__(
+        self,
+        length: int = 20,
+        std: float = 2.0,
+        ddof: int = 1,
+        source: str = "close",
+    ):
+        super().__init__(length=length, std=std, ddof=ddof, source=source)
+        self.length = length
+        self.std = std
+        self.ddof = ddof
+        self.source = BAR_COLUMNS.index(source)
+        self._window: deque[float] = deque()
+        self._sum = 0.0
+        self._sum_sq = 0.0
+
+    def update(self, ts, bar):
+        x = bar[self.source]
+        self._window.append(x)
+        self._sum += x
+        self._sum_sq += x * x
+
+        if len(self._window) > self.length:
+            old = self._window.popleft()
+            self._sum -= old
+            self._sum_sq -= old * old
+
+        if len(self._window) == self.length:
+            mid = self._sum / self.length
+            variance = (self._sum_sq - self.length * mid * mid) / (
+                self.length - self.ddof
+            )
+            deviation = self.std * math.sqrt(max(variance, 0.0))
+            self.value = (mid - deviation, mid, mid + deviation)
+
+        return self.value
+
+
+class IndicatorSet:
+    """Named indicators of one ticker, updated together per bar"""
+
+    def __init__(self, templates: dict[str, Indicator]):
+        self.indicators = {name: ind.spawn() for name, ind in templates.items()}
+
+    def update(self, ts: int, bar: Sequence[float]):
+        for indicator in self.indicators.values():
+            indicator.update(ts, bar)
+
+    def replay(self, ts: Sequence[int], values):
+        """Feeds history (values shaped like BarBuffer.view) through every indicator"""
+        for idx in range(len(ts)):
+            self.update(int(ts[idx]), values[:, idx].tolist())
+
+    @property
+    def latest(self) -> dict[str, IndicatorValue]:
+        return {name: ind.value for name, ind in self.indicators.items()}
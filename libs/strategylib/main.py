@@ -1,23 +1,181 @@
-import json
+import os
+import math
+import time
+import numpy as np
 import pandas as pd
+from collections import defaultdict
+from datetime import datetime, timedelta
+from concurrent.futures import Executor, ProcessPoolExecutor
 from pandas import DataFrame
 from typing import Dict, Literal, Callable, Optional
 from pydantic import BaseModel
+from confluent_kafka import TopicPartition
 
 from datastore import DataStore
-from kafkalib import Kafka, Timeframe, Signal, SignalEvent, Topics
+from kafkalib import (
+    Kafka,
+    Timeframe,
+    Signal,
+    SignalEvent,
+    Topics,
+    decode_bar,
+    encode_signal,
+    get_producer,
+    partition_for,
+)
 from storelib import Store, Strategy
 from .data_builder import DataBuilder
+from .bar_buffer import Bars, DEFAULT_LOOKBACK
+from .shared import SharedHandle, attach_bars
+from .indicators import Indicator, IndicatorSet
 
 
 StrategyFn = Callable[[DataFrame], Signal | list[Signal] | None]
+BarsStrategyFn = Callable[[Bars], Signal | list[Signal] | None]
+DataFormat = Literal["pandas", "numpy"]
+
+# A batch is handed over once it holds this many messages or the latency elapses
+STRATEGY_BATCH_SIZE = int(os.getenv("STRATEGY_BATCH_SIZE", "500"))
+STRATEGY_BATCH_LATENCY = float(os.getenv("STRATEGY_BATCH_LATENCY", "0.25"))
+
+# Feed messages this many seconds older than a warm start's query are
+# replayed too, bars already loaded from the store are skipped
+STRATEGY_WARMUP_REPLAY = int(os.getenv("STRATEGY_WARMUP_REPLAY", "120"))
+
+SESSION_MINUTES = 375
+# Last bucket of a session ends at the close, like the feed's aggregator
+SESSION_CLOSE = pd.Timedelta(hours=15, minutes=30)
+
+# Worker processes evaluating tickers of a batch in parallel, 0 runs inline
+STRATEGY_WORKERS = int(os.getenv("STRATEGY_WORKERS", "0"))
 
 ds = DataStore()
 kafka = Kafka()
-kafka_app = kafka.get_app()
+producer = get_producer()
 store = Store()
 
 
+def _tf_minutes(tf: Timeframe) -> int:
+    return int(tf[:-1]) * (60 if tf.endswith("H") else 1)
+
+
+def seek_to_replay(
+    consumer,
+    partitions,
+    replay_from: dict[str, int],
+    seeked: set[tuple[str, int]],
+    assign: bool = True,
+):
+    """
+    Seeks partitions assigned for the first time to the epoch ms their
+    topic's warm start began, so bars published during it are replayed.
+    Later rebalances resume from committed offsets. From the assign callback
+    the offsets are passed to `assign`, outside it `assign=False` seeks.
+    """
+    fresh = [
+        tp
+        for tp in partitions
+        if tp.topic in replay_from and (tp.topic, tp.partition) not in seeked
+    ]
+    if not fresh:
+        return
+
+    query = [TopicPartition(tp.topic, tp.partition, replay_from[tp.topic]) for tp in fresh]
+    offsets = {
+        (tp.topic, tp.partition): tp.offset
+        for tp in consumer.offsets_for_times(query, timeout=10)
+    }
+    seeked |= {(tp.topic, tp.partition) for tp in fresh}
+
+    if not assign:
+        for tp in fresh:
+            offset = offsets.get((tp.topic, tp.partition), -1)
+            if offset >= 0:
+                consumer.seek(TopicPartition(tp.topic, tp.partition, offset))
+        return
+
+    for tp in partitions:
+        offset = offsets.get((tp.topic, tp.partition), -1)
+        if offset >= 0:
+            tp.offset = offset
+
+    consumer.assign(partitions)
+
+
+def preload(
+    store: DataBuilder,
+    tickers: list[str],
+    tf: Timeframe,
+    bars: int,
+    name: str,
+) -> tuple[int | None, list[str]]:
+    """
+    Loads the latest `bars` closed bars of the `tickers` without data into
+    `store` in one bulk read. Returns the epoch ms the feed should be
+    replayed from, so bars published while it ran aren't missed, and the
+    tickers that were loaded.
+    """
+    tickers = [tick for tick in tickers if len(store.data[tick]) == 0]
+    if not tickers:
+        return None, []
+
+    sessions = math.ceil(bars * _tf_minutes(tf) / SESSION_MINUTES)
+    # Weekends and holidays, the surplus is trimmed below
+    start_date = datetime.now() - timedelta(days=math.ceil(sessions * 7 / 5) + 7)
+
+    replay_from = int((time.time() - STRATEGY_WARMUP_REPLAY) * 1000)
+    frames = ds.get_historic_data_many(
+        tickers,
+        tf,  # type: ignore
+        start_date=start_date.strftime("%Y-%m-%d"),
+        tz=store.tz,
+    )
+
+    # History is bucketed from the 09:15 open like the feed. The last
+    # bucket may still be open, the feed delivers it once complete
+    now = pd.Timestamp.now(tz=store.tz)
+    span = pd.Timedelta(minutes=_tf_minutes(tf))
+    loaded = []
+
+    for tick, df in frames.items():  # type: ignore
+        if not df.empty:
+            index = pd.DatetimeIndex(df.index)
+            ends = np.minimum(index + span, index.normalize() + SESSION_CLOSE)
+            df = df[ends <= now]
+
+        if df.empty:
+            print(f"{name}: No history for {tick}")
+            continue
+
+        store.init_ticker_data(tick, df.tail(bars))
+        loaded.append(tick)
+
+    print(f"{name}: Warm started {len(tickers)} tickers")
+
+    return replay_from, loaded
+
+
+def _evaluate_job(
+    strategy: StrategyFn | BarsStrategyFn,
+    ticker: str,
+    handle: SharedHandle,
+    window: tuple[int, int],
+    tz: str,
+    indicators: dict,
+    data_format: DataFormat,
+    lookback: int,
+):
+    ts, values = attach_bars(handle)
+
+    # Zero-copy slice of the ticker's live rows in its shared ring buffer
+    start, size = window
+    end = start + size
+    start = max(start, end - lookback)
+    bars = Bars(ticker, ts[start:end], values[:, start:end], tz, indicators)
+
+    return strategy(bars if data_format == "numpy" else bars.to_frame())  # type: ignore
+
+
 class StrategyConfig(BaseModel):
     name: str
     tickers: str | list[str]
@@ -32,14 +190,44 @@ class StrategyBuilder:
         tickers: str | list[str],
         run_tf: Timeframe,
         broker: Literal["UPSTOX"],
-        strategy: StrategyFn,
+        strategy: StrategyFn | BarsStrategyFn,
         init_data: Optional[DataFrame | Dict[str, DataFrame]] = None,
+        max_lookback: int = DEFAULT_LOOKBACK,
+        data_format: DataFormat = "pandas",
+        indicators: Optional[Dict[str, Indicator]] = None,
+        group_id: Optional[str] = None,
+        workers: int = STRATEGY_WORKERS,
+        warmup: int | Dict[Timeframe, int] = 0,
     ):
         if isinstance(tickers, str):
             tickers = [tickers]
 
-        self.store = DataBuilder(tickers)
+        # With workers, the strategy function must be a top-level callable
+        # so it can be pickled, it's evaluated on a process pool over bars
+        # kept in shared memory
+        self.workers = workers
+        self.store = DataBuilder(tickers, max_lookback=max_lookback, shared=workers > 0)
+        self.max_lookback = max_lookback
+        self._tickers = set(tickers)
+        # Workers started with the same group split the feed partitions,
+        # each one only handles the tickers of the partitions it owns
+        self.group_id = group_id or f"strategy-{name}"
+        self.owned: set[str] = set()
+        # Tickers and partitions assigned since the poll loop last claimed,
+        # rebalance callbacks only record them so they return quickly
+        self._unclaimed: set[str] = set()
+        self._unseeked: list[TopicPartition] = []
+        # Tickers this instance marked as priority
+        self._priority: set[str] = set()
+        # Epoch ms the feed is replayed from after a warm start
+        self._replay_from: int | None = None
+        self._seeked: set[tuple[str, int]] = set()
         self.strategy = strategy
+        self.data_format = data_format
+        self.indicator_templates = indicators or {}
+        self.indicators = {
+            tick: IndicatorSet(self.indicator_templates) for tick in tickers
+        }
         self.config = StrategyConfig(
             name=name,
             tickers=tickers,
@@ -65,13 +253,32 @@ class StrategyBuilder:
             self._add_data_to_store(init_data)
             self.init_data = init_data
 
-        for tick in self.config.tickers:
-            ds.add_to_priority(tick)
+        if isinstance(warmup, dict):
+            warmup = warmup.get(run_tf, 0)
+
+        # Tickers are marked as priority and warm started once they're
+        # claimed, i.e. when this worker is assigned their partitions
+        self.warmup = min(warmup, max_lookback)
 
     def __del__(self):
-        # Remove tickers from priority when strategy is deleted
-        for tick in self.config.tickers:
-            ds.remove_from_priority(tick)
+        self.release(set(getattr(self, "_priority", ())))
+
+    def claim(self, tickers, warm: bool = True):
+        """Marks `tickers` as priority and, with `warm`, warm starts them"""
+        for tick in tickers:
+            if tick not in self._priority:
+                ds.add_to_priority(tick)
+                self._priority.add(tick)
+
+        if warm and self.warmup > 0:
+            self.warm_start(self.warmup, tickers)
+
+    def release(self, tickers):
+        """Removes the priority of `tickers` claimed by this instance"""
+        for tick in tickers:
+            if tick in self._priority:
+                ds.remove_from_priority(tick)
+                self._priority.discard(tick)
 
     def _validate_init_data(self, init_data: DataFrame | Dict[str, DataFrame]):
         if init_data is not None:
@@ -93,62 +300,234 @@ class StrategyBuilder:
         if isinstance(init_data, DataFrame) and isinstance(self.config.tickers, str):
             init_data.set_index("ts", inplace=True)
             self.store.init_ticker_data(self.config.tickers, init_data)
+            self._replay_indicators(self.config.tickers)
 
         if isinstance(init_data, Dict):
             for tick in self.config.tickers:
                 df = init_data[tick]
                 df.set_index("ts", inplace=True)
                 self.store.init_ticker_data(tick, df)
+                self._replay_indicators(tick)
+
+    def _replay_indicators(self, tick: str):
+        ts, values = self.store.data[tick].view()
+        self.indicators[tick] = IndicatorSet(self.indicator_templates)
+        self.indicators[tick].replay(ts, values)
+
+    def warm_start(self, bars: int, tickers=None):
+        """
+        Preloads the latest `bars` bars of `tickers` (all by default) that
+        have no data yet, and replays the feed from just before the read.
+        """
+        replay_from, loaded = preload(
+            self.store,
+            self.config.tickers if tickers is None else tickers,
+            self.config.run_tf,
+            bars,
+            self.config.name,
+        )
+        if replay_from is not None:
+            self._replay_from = replay_from
+
+        for tick in loaded:
+            self._replay_indicators(tick)
+
+    def add_bar(self, tick: str, bar_data: Dict[str, str | int | float]):
+        ts, values = self.store.add_data(tick, bar_data)
+        self.indicators[tick].update(ts, values)
+
+    def add_bars(self, tick: str, bars: list[Dict[str, str | int | float]]) -> int:
+        ts, values = self.store.add_many(tick, bars)
+        self.indicators[tick].replay(ts, values)
+
+        return len(ts)
+
+    def _get_strategy_input(self, tick: str) -> DataFrame | Bars:
+        # DataFrames are only built for strategies that ask for one
+        indicators = self.indicators[tick].latest
+
+        if self.data_format == "numpy":
+            return self.store.get_data(tick, indicators, self.max_lookback)
+
+        return self.store.get_frame(tick, indicators, self.max_lookback)
+
+    def _emit_signals(self, tick: str, signals: Signal | list[Signal]):
+        if isinstance(signals, Signal):
+            signals = [signals]
+
+        for signal in signals:
+            producer.produce(
+                topic=Topics.SIGNALS.value.name,
+                key=tick.encode("utf-8"),
+                value=encode_signal(
+                    SignalEvent(
+                        ticker=tick,
+                        strategy=self.config.name,
+                        quantity=signal.quantity,
+                        action=signal.action,
+                        type=signal.type,
+                        order_type=signal.order_type,
+                        sl=signal.sl,
+                        tp=signal.tp,
+                        limit_price=signal.limit_price,
+                        position=signal.position,
+                    )
+                ),
+            )
+
+    def _evaluate(self, tick: str):
+        self._handle_signals(tick, self.strategy(self._get_strategy_input(tick)))  # type: ignore
+
+    def _handle_signals(self, tick: str, signals: Signal | list[Signal] | None):
+        if signals is None:
+            print("No Signal")
+            return
+
+        self._emit_signals(tick, signals)
+
+    def _evaluate_on(self, executor: Executor, ticks: list[str]):
+        """Evaluates tickers on the pool, signals are produced in `ticks` order"""
+        jobs = []
+
+        for tick in ticks:
+            buffer = self.store.data[tick]
+            future = executor.submit(
+                _evaluate_job,
+                self.strategy,
+                tick,
+                buffer.handle,  # type: ignore
+                buffer.window,
+                self.store.tz,
+                self.indicators[tick].latest,
+                self.data_format,
+                self.max_lookback,
+            )
+            jobs.append((tick, future))
+
+        # Buffers aren't appended to until every job has read them
+        for tick, future in jobs:
+            self._handle_signals(tick, future.result())
+
+    def _tickers_of(self, partitions) -> set[str]:
+        numbers = {partition.partition for partition in partitions}
+        return {tick for tick in self._tickers if partition_for(tick) in numbers}
+
+    def _on_assign(self, consumer, partitions):
+        assigned = self._tickers_of(partitions) - self.owned
+        self.owned |= assigned
+        self._unclaimed |= assigned
+        self._unseeked += [TopicPartition(tp.topic, tp.partition) for tp in partitions]
+        print(f"{self.config.name}: Owns {len(self.owned)} tickers")
+
+    def _on_revoke(self, consumer, partitions):
+        revoked = self._tickers_of(partitions)
+        self.owned -= revoked
+        self._unclaimed -= revoked
+        # Their next owner claims them, so their priority is left set
+        self._priority -= revoked
+
+        numbers = {(tp.topic, tp.partition) for tp in partitions}
+        self._unseeked = [
+            tp for tp in self._unseeked if (tp.topic, tp.partition) not in numbers
+        ]
+
+    def _claim_assigned(self, consumer):
+        """Warm starts newly assigned tickers, then replays their partitions"""
+        if self._unclaimed:
+            self.claim(sorted(self._unclaimed))
+            self._unclaimed = set()
+
+        if self._unseeked and self._replay_from is not None:
+            replay_from = {tp.topic: self._replay_from for tp in self._unseeked}
+            seek_to_replay(
+                consumer, self._unseeked, replay_from, self._seeked, assign=False
+            )
 
-    def run(self):
+        self._unseeked = []
+
+    def _group_batch(self, messages) -> dict[str, list[dict]]:
+        """Decodes the batch's bars of this strategy's tickers, grouped per ticker in offset order"""
+        batch = defaultdict(list)
+
+        for message in messages:
+            if message.error() is not None:
+                print(f"{self.config.name}: {message.error()}")
+                continue
+
+            tick = message.key().decode("utf-8")
+
+            if tick in self.owned:
+                batch[tick].append(decode_bar(message.value()))
+
+        return batch
+
+    def run(
+        self,
+        batch_size: int = STRATEGY_BATCH_SIZE,
+        max_batch_latency: float = STRATEGY_BATCH_LATENCY,
+    ):
+        """
+        Consumes the feed in batches of up to `batch_size` messages, waiting
+        at most `max_batch_latency` seconds for one to fill. Bars are appended
+        per ticker in bulk and the strategy runs once per ticker per batch,
+        on its latest bar. Each worker of the strategy's consumer group only
+        receives and evaluates the tickers of its assigned partitions.
+
+        With `workers`, a batch's tickers are evaluated in parallel on a
+        process pool and their signals produced in batch order.
+
+        Offsets are committed once a batch is evaluated, a worker that fails
+        mid batch leaves it to be consumed again. Newly assigned tickers are
+        warm started from the poll loop before the batch is evaluated.
+        """
         datafeed_topic = kafka.get_feed_topic(self.config.run_tf)
+        executor = None
+
+        if self.workers > 0:
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+            # Forks every worker now, before the consumer's threads exist
+            executor.submit(int).result()
+
+        try:
+            with kafka.get_consumer(self.group_id, auto_commit_enable=False) as consumer:
+                consumer.subscribe(
+                    [datafeed_topic.name],
+                    on_assign=self._on_assign,
+                    on_revoke=self._on_revoke,
+                    on_lost=self._on_revoke,
+                )
 
-        with kafka_app.get_consumer() as consumer:
-            consumer.subscribe([datafeed_topic.name])
-
-            while True:
-                res = consumer.poll(5)
-
-                if res is None:
-                    print(f"{self.config.name}: No Data")
-                    continue
-
-                current_tick = res.key().decode("utf-8")  # type: ignore
-
-                if current_tick in self.config.tickers:
-                    bar_data = res.value().decode("utf-8")  # type: ignore
-                    bar_data = json.loads(bar_data)
-                    self.store.add_data(current_tick, bar_data)
-
-                    signals = self.strategy(self.store.get_data(current_tick))
-
-                    if signals is None:
-                        print("No Signal")
-                        continue
-
-                    with kafka_app.get_producer() as producer:
-                        if isinstance(signals, Signal):
-                            signals = [signals]
-
-                        for signal in signals:
-                            producer.produce(
-                                topic=Topics.SIGNALS.value.name,
-                                key=current_tick.encode("utf-8"),
-                                value=json.dumps(
-                                    SignalEvent(
-                                        ticker=current_tick,
-                                        strategy=self.config.name,
-                                        quantity=signal.quantity,
-                                        action=signal.action,
-                                        type=signal.type,
-                                        order_type=signal.order_type,
-                                        sl=signal.sl,
-                                        tp=signal.tp,
-                                        limit_price=signal.limit_price,
-                                        position=signal.position,
-                                    ).model_dump()
-                                ).encode("utf-8"),
-                            )
+                try:
+                    while True:
+                        messages = consumer.consume(
+                            num_messages=batch_size, timeout=max_batch_latency
+                        )
+                        self._claim_assigned(consumer)
+
+                        if not messages:
+                            continue
+
+                        # Tickers whose bars were all replays aren't evaluated again
+                        batch = self._group_batch(messages)
+                        ticks = [
+                            tick for tick, bars in batch.items() if self.add_bars(tick, bars)
+                        ]
+
+                        if executor is None:
+                            for tick in ticks:
+                                self._evaluate(tick)
+                        else:
+                            self._evaluate_on(executor, ticks)
+
+                        consumer.commit(asynchronous=False)
+                finally:
+                    # Released before leaving the group, the workers taking
+                    # over the partitions claim their tickers again
+                    self.release(set(self._priority))
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+                self.store.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,80 @@
+import numpy as np
+from multiprocessing import shared_memory
+
+from .bar_buffer import BAR_COLUMNS, DEFAULT_LOOKBACK, BarBuffer
+
+# (shared memory name, rows)
+SharedHandle = tuple[str, int]
+
+_attached: dict[str, tuple[shared_memory.SharedMemory, np.ndarray, np.ndarray]] = {}
+
+
+def _views(shm: shared_memory.SharedMemory, rows: int):
+    ts = np.ndarray((rows,), dtype="int64", buffer=shm.buf, offset=0)
+    values = np.ndarray(
+        (len(BAR_COLUMNS), rows), dtype="float64", buffer=shm.buf, offset=8 * rows
+    )
+    return ts, values
+
+
+def create_shared_bars(rows: int):
+    """Allocates a shared block laid out as (ts, values) like BarBuffer.view"""
+    size = max(8 * rows * (1 + len(BAR_COLUMNS)), 1)
+    shm = shared_memory.SharedMemory(create=True, size=size)
+    ts, values = _views(shm, rows)
+
+    return shm, (shm.name, rows), ts, values
+
+
+def share_bars(ts: np.ndarray, values: np.ndarray):
+    """Copies bars into shared memory once so workers can read them unpickled"""
+    shm, handle, shared_ts, shared_values = create_shared_bars(len(ts))
+    shared_ts[:] = ts
+    shared_values[:] = values
+
+    return shm, handle
+
+
+def attach_bars(handle: SharedHandle) -> tuple[np.ndarray, np.ndarray]:
+    """Maps a shared block into this process, attachments are cached per process"""
+    name, rows = handle
+
+    if name not in _attached:
+        # Pool workers share the creator's resource tracker, so attaching
+        # doesn't hand ownership of the block to the worker.
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = (shm, *_views(shm, rows))
+
+    _, ts, values = _attached[name]
+    return ts, values
+
+
+def release_bars(shm: shared_memory.SharedMemory):
+    shm.close()
+    shm.unlink()
+
+
+class SharedBarBuffer(BarBuffer):
+    """
+    BarBuffer whose rows live in shared memory. Workers attach to `handle`
+    and slice `window` out of it, nothing is pickled but the handle.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_LOOKBACK):
+        self._shm: shared_memory.SharedMemory | None = None
+        super().__init__(capacity)
+
+    def _allocate(self, rows: int) -> tuple[np.ndarray, np.ndarray]:
+        self._shm, self.handle, ts, values = create_shared_bars(rows)
+        return ts, values
+
+    def close(self):
+        """Frees the block, the buffer is empty and unusable afterwards"""
+        if self._shm is None:
+            return
+
+        # The block can't be closed while arrays still map it
+        self._ts = self._values = np.zeros(0)  # type: ignore
+        self._start = self._size = 0
+        release_bars(self._shm)
+        self._shm = None
@@ -0,0 +1,174 @@
+import os
+import itertools
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pandas import DataFrame
+from typing import Any, Callable, Dict, Optional
+
+from kafkalib import Timeframe
+from .backtest import Backtest, run_backtest
+from .bar_buffer import DEFAULT_LOOKBACK
+from .indicators import Indicator
+from .shared import SharedHandle, attach_bars, release_bars, share_bars
+
+# Both factories must be importable top-level callables so jobs can be pickled
+StrategyFactory = Callable[..., Callable]
+IndicatorFactory = Callable[..., Dict[str, Indicator]]
+
+
+def _run_job(
+    strategy_factory: StrategyFactory,
+    indicator_factory: Optional[IndicatorFactory],
+    params: dict,
+    ticker: str,
+    handle: SharedHandle,
+    start_ns: int,
+    end_ns: int,
+    options: dict,
+) -> dict:
+    ts, values = attach_bars(handle)
+
+    # Zero-copy slice of the shared arrays for this job's [start, end) range
+    lo = int(np.searchsorted(ts, start_ns, side="left"))
+    hi = int(np.searchsorted(ts, end_ns, side="left"))
+
+    result = run_backtest(
+        strategy_factory(**params),
+        {ticker: (ts[lo:hi], values[:, lo:hi])},
+        indicators=indicator_factory(**params) if indicator_factory else None,
+        **options,
+    )
+    result.params = params
+
+    return result.summary()
+
+
+class Sweep:
+    """
+    Backtests every combination of `param_grid` over tickers and date ranges
+    on a process pool. Bars are loaded once in the parent and shared with
+    workers through shared memory instead of pickling DataFrames.
+    """
+
+    def __init__(
+        self,
+        strategy_factory: StrategyFactory,
+        param_grid: Dict[str, list[Any]],
+        tickers: str | list[str],
+        run_tf: Timeframe,
+        date_ranges: list[tuple[str, str]],
+        indicator_factory: Optional[IndicatorFactory] = None,
+        capital: float = 100000.0,
+        data_format: str = "pandas",
+        max_lookback: int = DEFAULT_LOOKBACK,
+        max_workers: Optional[int] = None,
+        rank_by: str = "pnl",
+        tz: str = "Asia/Kolkata",
+    ):
+        if isinstance(tickers, str):
+            tickers = [tickers]
+
+        self.strategy_factory = strategy_factory
+        self.indicator_factory = indicator_factory
+        self.param_grid = param_grid
+        self.tickers = tickers
+        self.run_tf = run_tf
+        self.date_ranges = date_ranges
+        self.capital = capital
+        self.data_format = data_format
+        self.max_lookback = max_lookback
+        self.max_workers = max_workers or os.cpu_count()
+        self.rank_by = rank_by
+        self.tz = tz
+
+    def params(self) -> list[dict]:
+        keys = list(self.param_grid.keys())
+        return [
+            dict(zip(keys, combination))
+            for combination in itertools.product(*self.param_grid.values())
+        ]
+
+    def _to_ns(self, ts: str) -> int:
+        stamp = pd.Timestamp(ts)
+        if stamp.tzinfo is None:
+            stamp = stamp.tz_localize(self.tz)
+
+        return stamp.value
+
+    def _end_ns(self, end: str) -> int:
+        # End dates are inclusive, their range runs up to the next midnight
+        stamp = pd.Timestamp(end)
+        if stamp.tzinfo is None:
+            stamp = stamp.tz_localize(self.tz)
+
+        return (stamp.normalize() + pd.Timedelta(days=1)).value
+
+    def run(self) -> DataFrame:
+        start_date = min(start for start, _ in self.date_ranges)
+        end_date = max(end for _, end in self.date_ranges)
+        # Loaded through the next midnight, jobs slice their exact ranges
+        load_end = (pd.Timestamp(end_date) + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+
+        bars = Backtest(
+            strategy=self.strategy_factory,
+            tickers=self.tickers,
+            run_tf=self.run_tf,
+            start_date=start_date,
+            end_date=load_end,
+            tz=self.tz,
+        ).load()
+
+        options = {
+            "capital": self.capital,
+            "data_format": self.data_format,
+            "max_lookback": self.max_lookback,
+            "tz": self.tz,
+        }
+
+        blocks = {tick: share_bars(*bars[tick]) for tick in self.tickers}
+        del bars
+
+        rows = []
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {}
+
+                for params in self.params():
+                    for tick in self.tickers:
+                        for start, end in self.date_ranges:
+                            future = executor.submit(
+                                _run_job,
+                                self.strategy_factory,
+                                self.indicator_factory,
+                                params,
+                                tick,
+                                blocks[tick][1],
+                                self._to_ns(start),
+                                self._end_ns(end),
+                                options,
+                            )
+                            futures[future] = (tick, start, end)
+
+                for future in as_completed(futures):
+                    tick, start, end = futures[future]
+                    rows.append(
+                        {
+                            "ticker": tick,
+                            "start_date": start,
+                            "end_date": end,
+                            **future.result(),
+                        }
+                    )
+        finally:
+            for shm, _ in blocks.values():
+                release_bars(shm)
+
+        results = DataFrame(rows)
+        if results.empty:
+            return results
+
+        results = results.sort_values(self.rank_by, ascending=False, ignore_index=True)
+        results.insert(0, "rank", results.index + 1)
+
+        return results
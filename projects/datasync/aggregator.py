@@ -0,0 +1,168 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, tzinfo
+
+import pandas as pd
+
+# Minutes per bar for every feed derived from 1M candles
+FEED_TIMEFRAMES = {
+    "2M": 2,
+    "3M": 3,
+    "5M": 5,
+    "10M": 10,
+    "15M": 15,
+    "30M": 30,
+    "1H": 60,
+    "4H": 240,
+}
+
+SESSION_OPEN = (9, 15)
+SESSION_CLOSE = (15, 30)
+
+ONE_MINUTE = timedelta(minutes=1)
+
+
+def session_bounds(ts: datetime) -> tuple[datetime, datetime]:
+    session_open = ts.replace(
+        hour=SESSION_OPEN[0], minute=SESSION_OPEN[1], second=0, microsecond=0
+    )
+    session_close = ts.replace(
+        hour=SESSION_CLOSE[0], minute=SESSION_CLOSE[1], second=0, microsecond=0
+    )
+    return session_open, session_close
+
+
+class BarAggregator:
+    """
+    Incremental OHLCV aggregator keyed by (ticker, timeframe).
+
+    1M bars are folded into the open bar of every timeframe in O(1); a bar is
+    returned as completed once its last minute arrives, or when a later bucket
+    starts without it. Buckets are aligned to the session open.
+    """
+
+    def __init__(self, tz: tzinfo, timeframes: dict[str, int] = FEED_TIMEFRAMES):
+        self.tz = tz
+        self.timeframes = timeframes
+        self._bars: dict[tuple[str, str], dict] = {}
+        self._last_ts: dict[str, datetime] = {}
+        self._lock = threading.Lock()
+
+    def is_seeded(self, ticker: str) -> bool:
+        return ticker in self._last_ts
+
+    def seed(self, ticker: str, data: pd.DataFrame | None):
+        """
+        Rebuilds the open bars of `ticker` from 1M history indexed by ts.
+        Bars completed while seeding were already published, so they're dropped.
+        """
+        with self._lock:
+            for key in [key for key in self._bars if key[0] == ticker]:
+                del self._bars[key]
+
+            self._last_ts[ticker] = datetime.min.replace(tzinfo=self.tz)
+
+            if data is None or data.empty:
+                return
+
+            for row in data.itertuples():
+                bar = {
+                    "ts": row.Index,
+                    "open": row.open,
+                    "high": row.high,
+                    "low": row.low,
+                    "close": row.close,
+                    "volume": row.volume,
+                    "oi": row.oi,
+                }
+                self._update(ticker, bar)
+
+    @contextmanager
+    def transaction(self, ticker: str):
+        """
+        Rolls the ticker's open bars back if the block raises, so a retried
+        publish folds the same 1M bars in again and re-emits what they closed.
+        """
+        with self._lock:
+            bars = {
+                key: dict(bar) for key, bar in self._bars.items() if key[0] == ticker
+            }
+            last_ts = self._last_ts.get(ticker)
+
+        try:
+            yield
+        except BaseException:
+            with self._lock:
+                for key in [key for key in self._bars if key[0] == ticker]:
+                    del self._bars[key]
+
+                self._bars.update(bars)
+                if last_ts is None:
+                    self._last_ts.pop(ticker, None)
+                else:
+                    self._last_ts[ticker] = last_ts
+            raise
+
+    def update(self, ticker: str, bar: dict) -> list[tuple[str, dict]]:
+        with self._lock:
+            return self._update(ticker, bar)
+
+    def _update(self, ticker: str, bar: dict) -> list[tuple[str, dict]]:
+        ts = bar["ts"]
+        if isinstance(ts, str):
+            ts = datetime.fromisoformat(ts)
+        ts = ts.astimezone(self.tz)
+
+        last_ts = self._last_ts.get(ticker)
+        if last_ts is not None and ts <= last_ts:
+            return []
+
+        self._last_ts[ticker] = ts
+
+        session_open, session_close = session_bounds(ts)
+        if ts < session_open or ts >= session_close:
+            return []
+
+        minutes = int((ts - session_open).total_seconds() // 60)
+        completed = []
+
+        for tf, multiplier in self.timeframes.items():
+            key = (ticker, tf)
+            bucket_start = session_open + timedelta(
+                minutes=(minutes // multiplier) * multiplier
+            )
+            bucket_end = min(bucket_start + timedelta(minutes=multiplier), session_close)
+
+            current = self._bars.get(key)
+
+            if current is not None and current["ts"] != bucket_start:
+                # Last minute of the bucket never arrived; it's complete all the
+                # same, unless it belongs to a previous session.
+                if current["ts"] >= session_open:
+                    completed.append((tf, current))
+                current = None
+
+            if current is None:
+                current = {
+                    "ts": bucket_start,
+                    "open": float(bar["open"]),
+                    "high": float(bar["high"]),
+                    "low": float(bar["low"]),
+                    "close": float(bar["close"]),
+                    "volume": int(bar["volume"]),
+                    "oi": float(bar["oi"]),
+                }
+            else:
+                current["high"] = max(current["high"], float(bar["high"]))
+                current["low"] = min(current["low"], float(bar["low"]))
+                current["close"] = float(bar["close"])
+                current["volume"] += int(bar["volume"])
+                current["oi"] = float(bar["oi"])
+
+            if ts + ONE_MINUTE >= bucket_end:
+                completed.append((tf, current))
+                self._bars.pop(key, None)
+            else:
+                self._bars[key] = current
+
+        return completed
@@ -0,0 +1,410 @@
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import pandas as pd
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from sources.upstox import UpstoxClient
+from fetcher import FetchEngine, UPSTOX_RATE_LIMITS
+from watermarks import WatermarkStore
+from ingest import IngestService
+from datastore import ParquetCache
+
+BACKFILL_CHECKPOINT = os.getenv("BACKFILL_CHECKPOINT", ".state/backfill.jsonl")
+BACKFILL_CHUNK_DAYS = int(os.getenv("BACKFILL_CHUNK_DAYS", "30"))
+BACKFILL_LOOKBACK_DAYS = int(os.getenv("BACKFILL_LOOKBACK_DAYS", "365"))
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "16"))
+# Time a chunk may spend fetching and queueing its rows, rate limiter waits
+# don't count, so quota exhaustion delays chunks instead of failing them
+BACKFILL_DEADLINE = float(os.getenv("BACKFILL_DEADLINE", "600"))
+BACKFILL_PROGRESS_INTERVAL = float(os.getenv("BACKFILL_PROGRESS_INTERVAL", "30"))
+
+CANDLE_COLUMNS = ["ts", "open", "high", "low", "close", "volume", "oi"]
+
+
+def split_date_range(
+    start: date, end: date, days: int = BACKFILL_CHUNK_DAYS
+) -> list[tuple[date, date]]:
+    """
+    Splits [start, end] into inclusive ranges of at most `days` days, oldest
+    first. Ranges are laid out backwards from `end`, so boundaries stay the
+    same when `start` moves forward between resumed runs.
+    """
+    ranges = []
+
+    while end >= start:
+        range_start = max(start, end - timedelta(days=days - 1))
+        ranges.append((range_start, end))
+        end = range_start - timedelta(days=1)
+
+    return ranges[::-1]
+
+
+@dataclass(frozen=True)
+class Chunk:
+    ticker: str
+    fetch_key: str
+    # None fetches today's intraday candles
+    from_date: date | None
+    to_date: date
+    since: datetime | None
+
+    @property
+    def key(self) -> str:
+        kind = "intraday" if self.from_date is None else "historical"
+        return f"{self.ticker}|{kind}|{self.to_date.isoformat()}"
+
+
+class Checkpoint:
+    """
+    Append-only JSONL log of completed chunks for the current run, so a
+    crashed backfill picks up where it stopped instead of starting over.
+    """
+
+    def __init__(self, path: str = BACKFILL_CHECKPOINT):
+        self.path = path
+        self.run_id: str | None = None
+        self.completed: set[str] = set()
+        # Newest candle of each ticker's completed chunks, for resumed watermarks
+        self.latest: dict[str, datetime] = {}
+        self._entries: list[dict] = []
+        self._lock = threading.Lock()
+
+    def open(self, run_id: str):
+        self.run_id = run_id
+        self.completed = set()
+        self.latest = {}
+        self._entries = []
+        stale = False
+
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Torn write from a crash
+                        continue
+
+                    if entry.get("run") == run_id:
+                        self._add(entry)
+                    else:
+                        stale = True
+
+        # Entries of earlier runs no longer apply
+        if stale:
+            self._rewrite()
+
+    def last_run(self) -> str | None:
+        """Run id of the entries on disk, a run leaves none once it finishes"""
+        if not os.path.exists(self.path):
+            return None
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    return json.loads(line).get("run")
+                except json.JSONDecodeError:
+                    continue
+
+        return None
+
+    def clear(self):
+        self.completed = set()
+        self.latest = {}
+        self._entries = []
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _rewrite(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in self._entries:
+                f.write(json.dumps(entry) + "\n")
+
+        os.replace(tmp_path, self.path)
+
+    def _add(self, entry: dict):
+        self.completed.add(entry["chunk"])
+        self._entries.append(entry)
+
+        if entry.get("latest"):
+            latest_ts = datetime.fromisoformat(entry["latest"])
+            current = self.latest.get(entry["ticker"])
+            self.latest[entry["ticker"]] = max(current or latest_ts, latest_ts)
+
+    def done(self, key: str) -> bool:
+        return key in self.completed
+
+    def mark(self, chunk: "Chunk", latest_ts: datetime | None = None):
+        with self._lock:
+            if chunk.key in self.completed:
+                return
+
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+
+            entry = {
+                "run": self.run_id,
+                "chunk": chunk.key,
+                "ticker": chunk.ticker,
+                "latest": latest_ts.isoformat() if latest_ts else None,
+            }
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+            self._add(entry)
+
+
+@dataclass
+class Progress:
+    total: int = 0
+    done: int = 0
+    failed: int = 0
+    rows: int = 0
+    started: float = 0.0
+
+    def summary(self) -> str:
+        elapsed = time.monotonic() - self.started
+        finished = self.done + self.failed
+        rate = finished / elapsed if elapsed else 0.0
+        eta = (self.total - finished) / rate if rate else float("inf")
+
+        return (
+            f"{finished}/{self.total} chunks ({self.failed} failed), "
+            f"{self.rows} rows, {rate:.1f} chunks/s, "
+            f"elapsed {timedelta(seconds=int(elapsed))}, "
+            f"ETA {timedelta(seconds=int(eta)) if rate else 'unknown'}"
+        )
+
+
+class Backfill:
+    """
+    Fetches every ticker's missing candles from its watermark to now, split
+    into date-range chunks run concurrently under the Upstox rate limits.
+    Chunks are checkpointed once their rows are flushed; a ticker's
+    watermark only advances after all of its chunks made it in.
+    """
+
+    def __init__(
+        self,
+        client: UpstoxClient,
+        ingest: IngestService,
+        watermarks: WatermarkStore,
+        tz,
+        checkpoint: Checkpoint | None = None,
+        chunk_days: int = BACKFILL_CHUNK_DAYS,
+        lookback_days: int = BACKFILL_LOOKBACK_DAYS,
+        concurrency: int = BACKFILL_CONCURRENCY,
+        deadline: float = BACKFILL_DEADLINE,
+        logger: logging.Logger | None = None,
+        cache: ParquetCache | None = None,
+    ):
+        self.client = client
+        self.ingest = ingest
+        self.watermarks = watermarks
+        self.tz = tz
+        self.checkpoint = checkpoint or Checkpoint()
+        self.chunk_days = chunk_days
+        self.lookback_days = lookback_days
+        self.concurrency = concurrency
+        self.deadline = deadline
+        self.logger = logger or logging.getLogger("backfill")
+        # Past days written here may have been read, and cached, while partial
+        self.cache = cache
+
+        self.progress = Progress()
+        self._lock = threading.Lock()
+        self._pending: Counter[str] = Counter()
+        self._latest: dict[str, datetime] = {}
+        self._failed: set[str] = set()
+        self._finished: set[str] = set()
+
+    def plan(self, tickers: list[dict[str, str]], today: date) -> list[Chunk]:
+        chunks = []
+
+        for tick in tickers:
+            since = self.watermarks.get(tick["query_key"])
+
+            if since is None:
+                start = today - timedelta(days=self.lookback_days)
+            else:
+                start = since.astimezone(self.tz).date()
+
+            # The historical API ends at the previous session, today comes from intraday
+            for from_date, to_date in split_date_range(
+                start, today - timedelta(days=1), self.chunk_days
+            ):
+                chunks.append(
+                    Chunk(tick["query_key"], tick["fetch_key"], from_date, to_date, since)
+                )
+
+            chunks.append(Chunk(tick["query_key"], tick["fetch_key"], None, today, since))
+
+        return chunks
+
+    def _finish(
+        self,
+        chunk: Chunk,
+        error: BaseException | None,
+        rows: int = 0,
+        latest_ts: datetime | None = None,
+    ):
+        with self._lock:
+            # A chunk that timed out after queueing its rows can report twice
+            if chunk.key in self._finished:
+                return
+
+            self._finished.add(chunk.key)
+
+            if error is None:
+                self.checkpoint.mark(chunk, latest_ts)
+                self.progress.done += 1
+                self.progress.rows += rows
+
+                if latest_ts is not None:
+                    current = self._latest.get(chunk.ticker)
+                    self._latest[chunk.ticker] = max(current or latest_ts, latest_ts)
+            else:
+                self.progress.failed += 1
+                self._failed.add(chunk.ticker)
+                self.logger.error("Backfill of %s failed: %r", chunk.key, error)
+
+            self._pending[chunk.ticker] -= 1
+
+            if self._pending[chunk.ticker] == 0 and chunk.ticker not in self._failed:
+                latest_ts = self._latest.pop(chunk.ticker, None)
+
+                if latest_ts is not None:
+                    self.watermarks.update(chunk.ticker, latest_ts)
+
+    async def _fetch(self, engine: FetchEngine, chunk: Chunk):
+        if chunk.from_date is None:
+            data = await self.client.fetch_intraday_data_async(
+                engine, chunk.fetch_key, since=chunk.since
+            )
+        else:
+            data = await self.client.fetch_historical_data_async(
+                engine,
+                chunk.fetch_key,
+                chunk.to_date,
+                chunk.from_date,
+                since=chunk.since,
+            )
+
+        if data.empty:
+            self._finish(chunk, None)
+            return 0
+
+        df = pd.DataFrame(data, columns=CANDLE_COLUMNS)
+        df["ticker"] = chunk.ticker
+        df["ts"] = pd.to_datetime(df["ts"])
+        rows = len(df)
+        latest_ts = df["ts"].max().to_pydatetime()
+
+        days = set(df["ts"].dt.tz_convert(self.tz).dt.date)
+
+        def on_done(error: BaseException | None):
+            if error is None and self.cache is not None:
+                self.cache.invalidate_days(chunk.ticker, days)
+
+            self._finish(chunk, error, rows, latest_ts)
+
+        # Blocks while the ingest queue is full, keep it off the event loop
+        await asyncio.to_thread(self.ingest.submit, df, on_done)
+
+        return rows
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(BACKFILL_PROGRESS_INTERVAL)
+            self.logger.info("Backfill progress: %s", self.progress.summary())
+
+    def _run_id(self, end: date) -> str:
+        # Chunk keys depend on the range end and the chunk size
+        return f"{end.isoformat()}/{self.chunk_days}d"
+
+    def _resume_end(self, today: date) -> date:
+        """
+        End of the interrupted run on disk, if it's still resumable, so a
+        run crossing midnight keeps its chunks instead of starting over.
+        """
+        run_id = self.checkpoint.last_run()
+        if run_id is None:
+            return today
+
+        end, _, chunking = run_id.partition("/")
+        try:
+            end = date.fromisoformat(end)
+        except ValueError:
+            return today
+
+        # An older run would advance watermarks past the days it never covered
+        if chunking != f"{self.chunk_days}d" or not today - timedelta(days=1) <= end <= today:
+            return today
+
+        return end
+
+    async def run(self, tickers: list[dict[str, str]]) -> Progress:
+        end = self._resume_end(datetime.now(self.tz).date())
+        self.checkpoint.open(self._run_id(end))
+
+        chunks = [
+            chunk
+            for chunk in self.plan(tickers, end)
+            if not self.checkpoint.done(chunk.key)
+        ]
+
+        self.progress = Progress(total=len(chunks), started=time.monotonic())
+        self._pending = Counter(chunk.ticker for chunk in chunks)
+        self._latest = {
+            ticker: ts
+            for ticker, ts in self.checkpoint.latest.items()
+            if ticker in self._pending
+        }
+        self._failed = set()
+        self._finished = set()
+
+        self.logger.info(
+            "Backfilling %d chunks for %d tickers (%d already done)",
+            len(chunks),
+            len(self._pending),
+            len(self.checkpoint.completed),
+        )
+
+        reporter = asyncio.create_task(self._report())
+
+        try:
+            async with FetchEngine(
+                concurrency=self.concurrency,
+                deadline=self.deadline,
+                rate_limits={self.client.HOST: UPSTOX_RATE_LIMITS},
+                pause_on_limiter=True,
+            ) as engine:
+                results = await engine.map(
+                    chunks, lambda chunk: self._fetch(engine, chunk)
+                )
+        finally:
+            reporter.cancel()
+
+        for chunk, result in results:
+            if isinstance(result, BaseException):
+                self._finish(chunk, result)
+
+        await asyncio.to_thread(self.ingest.flush)
+        self.logger.info("Backfill finished: %s", self.progress.summary())
+
+        # Failed tickers kept their watermarks, the next run retries them
+        self.checkpoint.clear()
+
+        return self.progress
@@ -0,0 +1,190 @@
+import os
+import time
+import asyncio
+import threading
+import aiohttp
+from contextvars import ContextVar
+from collections import deque
+from urllib.parse import urlparse
+from typing import Any, Awaitable, Callable, Iterable, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Upstox historical/intraday candle API quotas: (requests, window seconds)
+UPSTOX_RATE_LIMITS = [(50, 1.0), (500, 60.0), (2000, 1800.0)]
+
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "32"))
+FETCH_DEADLINE = float(os.getenv("FETCH_DEADLINE", "10"))
+FETCH_REQUEST_TIMEOUT = float(os.getenv("FETCH_REQUEST_TIMEOUT", "5"))
+
+
+class Deadline:
+    """An item's deadline, paused while any of its requests waits for quota"""
+
+    def __init__(self, timeout: asyncio.Timeout):
+        self.timeout = timeout
+        self.waiting = 0
+        self.remaining: float | None = None
+
+    def pause(self):
+        when = self.timeout.when()
+
+        if self.waiting == 0 and when is not None:
+            self.remaining = when - asyncio.get_running_loop().time()
+            self.timeout.reschedule(None)
+
+        self.waiting += 1
+
+    def resume(self):
+        self.waiting -= 1
+
+        if self.waiting == 0 and self.remaining is not None:
+            self.timeout.reschedule(asyncio.get_running_loop().time() + self.remaining)
+            self.remaining = None
+
+
+_deadline: ContextVar[Deadline | None] = ContextVar("deadline", default=None)
+
+
+class RateLimiter:
+    """
+    Sliding window limiter enforcing several (requests, seconds) quotas at once.
+    Thread safe, so jobs running their own event loops can share one quota.
+    """
+
+    def __init__(self, limits: list[tuple[int, float]]):
+        self.limits = limits
+        self._windows = [deque() for _ in limits]
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Takes a slot and returns 0, or returns how long to wait for one"""
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+
+            for (max_calls, period), window in zip(self.limits, self._windows):
+                while window and now - window[0] >= period:
+                    window.popleft()
+
+                if len(window) >= max_calls:
+                    wait = max(wait, period - (now - window[0]))
+
+            if wait <= 0:
+                for window in self._windows:
+                    window.append(now)
+
+            return wait
+
+    async def acquire(self):
+        while (wait := self._reserve()) > 0:
+            await asyncio.sleep(wait)
+
+
+# One limiter per host for the whole process, every engine draws from it
+_limiters: dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(host: str, limits: list[tuple[int, float]]) -> RateLimiter:
+    with _limiters_lock:
+        if host not in _limiters:
+            _limiters[host] = RateLimiter(limits)
+
+        return _limiters[host]
+
+
+class FetchEngine:
+    """
+    Pooled async HTTP client with bounded concurrency, per-host rate limiting
+    and per-item deadlines.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = FETCH_CONCURRENCY,
+        deadline: float = FETCH_DEADLINE,
+        request_timeout: float = FETCH_REQUEST_TIMEOUT,
+        rate_limits: dict[str, list[tuple[int, float]]] | None = None,
+        headers: dict[str, str] | None = None,
+        pause_on_limiter: bool = False,
+    ):
+        self.concurrency = concurrency
+        self.deadline = deadline
+        self.request_timeout = request_timeout
+        self.rate_limits = rate_limits or {}
+        self.headers = headers or {"Accept": "application/json"}
+        # Long jobs stop the deadline while queued on a quota, live ones
+        # keep it so an item stuck behind the quota is cut off in time
+        self.pause_on_limiter = pause_on_limiter
+
+        self._session: aiohttp.ClientSession | None = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def _get_limiter(self, host: str):
+        if host not in self.rate_limits:
+            return None
+
+        return get_limiter(host, self.rate_limits[host])
+
+    async def get_json(self, url: str) -> Any:
+        if self._session is None:
+            raise RuntimeError("FetchEngine must be used as an async context manager")
+
+        limiter = self._get_limiter(urlparse(url).netloc)
+        if limiter is not None:
+            # Quota waits can take minutes, only time spent fetching counts
+            deadline = _deadline.get() if self.pause_on_limiter else None
+            if deadline is not None:
+                deadline.pause()
+
+            try:
+                await limiter.acquire()
+            finally:
+                if deadline is not None:
+                    deadline.resume()
+
+        async with self._session.get(url) as response:
+            return await response.json(content_type=None)
+
+    async def map(
+        self,
+        items: Iterable[T],
+        worker: Callable[[T], Awaitable[R]],
+    ) -> list[tuple[T, R | BaseException]]:
+        """
+        Runs `worker` over all items with at most `concurrency` in flight.
+        Each item is cancelled once it exceeds `deadline` seconds, with
+        `pause_on_limiter` not counting time queued on rate limiters; failures are returned in place of
+        results so one ticker never sinks the batch.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(item: T):
+            async with semaphore:
+                try:
+                    async with asyncio.timeout(self.deadline) as timeout:
+                        _deadline.set(Deadline(timeout))
+                        return item, await worker(item)
+                except Exception as e:
+                    return item, e
+
+        return await asyncio.gather(*(run(item) for item in items))
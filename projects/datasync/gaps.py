@@ -0,0 +1,206 @@
+import os
+import asyncio
+import pandas as pd
+from datetime import date, timedelta
+from datastore import Database
+from sources.upstox import UpstoxClient
+from fetcher import FetchEngine
+from sessions import SessionCalendar
+from backfill import split_date_range, BACKFILL_CHUNK_DAYS, CANDLE_COLUMNS
+
+GAP_LOOKBACK_DAYS = int(os.getenv("GAP_LOOKBACK_DAYS", "7"))
+GAP_QUERY_CHUNK = 100
+
+
+def merge_candles(
+    frames: list[pd.DataFrame], missing: pd.DatetimeIndex | None = None
+) -> pd.DataFrame:
+    """
+    Combines candles from overlapping requests into one frame, oldest first,
+    with one row per timestamp. With `missing`, only those minutes are kept
+    so already stored bars aren't written twice.
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=CANDLE_COLUMNS)
+
+    df = pd.concat(frames, ignore_index=True)
+    ts = pd.to_datetime(df["ts"], utc=True)
+
+    keep = ~ts.duplicated(keep="first")
+    if missing is not None:
+        keep &= ts.isin(missing)
+
+    df = df[keep.to_numpy()]
+    return df.iloc[ts[keep].argsort()].reset_index(drop=True)
+
+
+def day_runs(days: list[date], calendar: SessionCalendar) -> list[tuple[date, date]]:
+    """Groups days into runs of consecutive trading days"""
+    runs = []
+
+    for day in sorted(days):
+        if runs:
+            first, last = runs[-1]
+            gap = calendar.trading_days(last + timedelta(days=1), day - timedelta(days=1))
+
+            if not gap:
+                runs[-1] = (first, day)
+                continue
+
+        runs.append((day, day))
+
+    return runs
+
+
+def plan_ranges(
+    days: list[date],
+    calendar: SessionCalendar,
+    chunk_days: int = BACKFILL_CHUNK_DAYS,
+) -> list[tuple[date, date]]:
+    """Splits incomplete days into API-sized (from, to) date ranges"""
+    ranges = []
+
+    for first, last in day_runs(days, calendar):
+        ranges.extend(split_date_range(first, last, chunk_days))
+
+    # Runs span weekends and holidays, skip chunks that only cover those
+    return [
+        (from_date, to_date)
+        for from_date, to_date in ranges
+        if any(from_date <= day <= to_date for day in days)
+    ]
+
+
+async def fetch_ranges(
+    client: UpstoxClient,
+    engine: FetchEngine,
+    fetch_key: str,
+    ranges: list[tuple[date, date]],
+    since=None,
+    missing: pd.DatetimeIndex | None = None,
+) -> pd.DataFrame:
+    frames = await asyncio.gather(
+        *(
+            client.fetch_historical_data_async(
+                engine, fetch_key, to_date, from_date, since=since
+            )
+            for from_date, to_date in ranges
+        )
+    )
+
+    return merge_candles(list(frames), missing)
+
+
+class GapDetector:
+    """
+    Finds trading days with fewer bars than the session calendar expects,
+    then the exact minutes missing from them.
+    """
+
+    def __init__(self, db: Database, calendar: SessionCalendar):
+        self.db = db
+        self.calendar = calendar
+
+    def _window(self, start: date, end: date):
+        session_start, _ = self.calendar.bounds(start)
+        _, session_end = self.calendar.bounds(end)
+
+        return session_start.to_pydatetime(), session_end.to_pydatetime()
+
+    def bar_counts(self, tickers: list[str], start: date, end: date) -> pd.DataFrame:
+        window_start, window_end = self._window(start, end)
+        counts = []
+
+        for idx in range(0, len(tickers), GAP_QUERY_CHUNK):
+            chunk = tickers[idx : idx + GAP_QUERY_CHUNK]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            query = f"""
+                SELECT ticker, ts, count() AS bars
+                FROM market_data
+                WHERE ticker IN ({placeholders}) AND ts >= %s AND ts < %s
+                SAMPLE BY 1d ALIGN TO CALENDAR TIME ZONE '{self.calendar.tz}';
+            """
+
+            with self.db.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, (*chunk, window_start, window_end))  # type: ignore
+                counts.extend(cursor.fetchall())
+
+        df = pd.DataFrame(counts, columns=["ticker", "ts", "bars"])
+        df["day"] = (
+            pd.to_datetime(df["ts"], utc=True).dt.tz_convert(self.calendar.tz).dt.date
+        )
+
+        return df
+
+    def incomplete_days(
+        self, tickers: list[str], start: date, end: date
+    ) -> dict[str, list[date]]:
+        days = self.calendar.trading_days(start, end)
+        if not days:
+            return {}
+
+        counts = self.bar_counts(tickers, start, end)
+        counts = counts.set_index(["ticker", "day"])["bars"]
+        expected = self.calendar.bars_per_session
+
+        incomplete = {}
+        for ticker in tickers:
+            short = [day for day in days if counts.get((ticker, day), 0) < expected]
+
+            if short:
+                incomplete[ticker] = short
+
+        return incomplete
+
+    def missing_minutes(self, ticker: str, days: list[date]) -> pd.DatetimeIndex:
+        window_start, window_end = self._window(min(days), max(days))
+        query = """
+            SELECT ts FROM market_data
+            WHERE ticker = %s AND ts >= %s AND ts < %s;
+        """
+
+        with self.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, (ticker, window_start, window_end))
+            stored = pd.to_datetime([row[0] for row in cursor.fetchall()], utc=True)
+
+        expected = pd.DatetimeIndex(
+            [minute for day in days for minute in self.calendar.minutes(day)]
+        )
+
+        return expected.difference(stored)
+
+
+async def fill_gaps(
+    client: UpstoxClient,
+    engine: FetchEngine,
+    detector: GapDetector,
+    tickers: list[dict[str, str]],
+    start: date,
+    end: date,
+    chunk_days: int = BACKFILL_CHUNK_DAYS,
+) -> list[tuple[dict[str, str], pd.DataFrame | BaseException]]:
+    """
+    Fetches the missing minutes of every ticker between `start` and `end`.
+    Ranges are fetched concurrently and merged, only bars that aren't
+    stored yet are returned. Failed tickers carry their exception.
+    """
+    by_key = {tick["query_key"]: tick for tick in tickers}
+    incomplete = await asyncio.to_thread(
+        detector.incomplete_days, list(by_key), start, end
+    )
+
+    async def worker(query_key: str):
+        days = incomplete[query_key]
+        missing = await asyncio.to_thread(detector.missing_minutes, query_key, days)
+        ranges = plan_ranges(days, detector.calendar, chunk_days)
+
+        return await fetch_ranges(
+            client, engine, by_key[query_key]["fetch_key"], ranges, missing=missing
+        )
+
+    results = await engine.map(list(incomplete), worker)
+
+    return [(by_key[query_key], result) for query_key, result in results]
@@ -0,0 +1,236 @@
+import os
+import time
+import queue
+import logging
+import threading
+import pandas as pd
+from typing import Callable
+from questdb.ingress import Sender
+
+INGEST_MAX_ROWS = int(os.getenv("INGEST_MAX_ROWS", "50000"))
+INGEST_LINGER = float(os.getenv("INGEST_LINGER", "0.5"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "256"))
+INGEST_RETRIES = int(os.getenv("INGEST_RETRIES", "3"))
+
+OnDone = Callable[[Exception | None], None]
+
+_FLUSH = object()
+_CLOSE = object()
+
+
+class IngestService:
+    """
+    Long-lived ILP writer shared by all fetch workers. Frames submitted from
+    any thread are coalesced into batches of up to `max_rows` rows or
+    `linger` seconds and flushed over one Sender connection. `submit` blocks
+    once `queue_size` frames are waiting, which pushes back on the fetchers.
+    """
+
+    def __init__(
+        self,
+        table: str = "market_data",
+        symbols: list[str] | None = None,
+        at: str = "ts",
+        max_rows: int = INGEST_MAX_ROWS,
+        linger: float = INGEST_LINGER,
+        queue_size: int = INGEST_QUEUE_SIZE,
+        retries: int = INGEST_RETRIES,
+        logger: logging.Logger | None = None,
+    ):
+        self.table = table
+        self.symbols = symbols or ["ticker"]
+        self.at = at
+        self.max_rows = max_rows
+        self.linger = linger
+        self.retries = retries
+        self.logger = logger or logging.getLogger("ingest")
+
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.thread: threading.Thread | None = None
+        self.sender: Sender | None = None
+        self._lock = threading.Lock()
+
+        self.rows = 0
+        self.flushes = 0
+        self.failures = 0
+        self.flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.started_at = time.monotonic()
+
+    def start(self):
+        with self._lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+
+            self.started_at = time.monotonic()
+            self.thread = threading.Thread(
+                target=self._run, name="ingest", daemon=True
+            )
+            self.thread.start()
+
+    def submit(self, df: pd.DataFrame, on_done: OnDone | None = None):
+        """Queues a frame for writing, `on_done` runs once it's flushed or failed"""
+        if df.empty:
+            if on_done:
+                on_done(None)
+            return
+
+        self.start()
+        self.queue.put((df, on_done))
+
+    def flush(self):
+        """Blocks until everything submitted so far has been written"""
+        if self.thread is None:
+            return
+
+        self.queue.put(_FLUSH)
+        self.queue.join()
+
+    def close(self):
+        if self.thread is None:
+            return
+
+        self.queue.put(_CLOSE)
+        self.thread.join()
+        self.thread = None
+
+    def stats(self) -> dict[str, float]:
+        elapsed = time.monotonic() - self.started_at
+
+        return {
+            "rows": self.rows,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "rows_per_sec": self.rows / elapsed if elapsed else 0.0,
+            "avg_flush_ms": 1000 * self.flush_seconds / self.flushes
+            if self.flushes
+            else 0.0,
+            "max_flush_ms": 1000 * self.max_flush_seconds,
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        self.logger.info(
+            "Ingested %d rows in %d flushes (%.0f rows/s, avg flush %.1fms, max %.1fms, %d failed)",
+            stats["rows"],
+            stats["flushes"],
+            stats["rows_per_sec"],
+            stats["avg_flush_ms"],
+            stats["max_flush_ms"],
+            stats["failures"],
+        )
+
+    def _connect(self) -> Sender:
+        if self.sender is None:
+            self.sender = Sender.from_env()
+            self.sender.establish()
+
+        return self.sender
+
+    def _disconnect(self):
+        if self.sender is not None:
+            try:
+                self.sender.close(flush=False)
+            except Exception:
+                pass
+
+            self.sender = None
+
+    def _write(self, batch: list[tuple[pd.DataFrame, OnDone | None]]):
+        error: Exception | None = None
+        # A frame that fails to serialise is rewound out of the buffer and
+        # fails on its own, the rest of the batch is still written
+        rejected: dict[int, Exception] = {}
+
+        for attempt in range(self.retries):
+            rows = 0
+
+            try:
+                sender = self._connect()
+                buffer = sender.new_buffer()
+
+                for idx, (df, _) in enumerate(batch):
+                    if idx in rejected:
+                        continue
+
+                    try:
+                        buffer.dataframe(
+                            df, table_name=self.table, symbols=self.symbols, at=self.at
+                        )
+                        rows += len(df)
+                    except Exception as e:
+                        rejected[idx] = e
+                        self.failures += 1
+                        self.logger.error("Rejected frame of %d rows: %s", len(df), e)
+
+                if rows == 0:
+                    break
+
+                started = time.perf_counter()
+                sender.flush(buffer)
+                elapsed = time.perf_counter() - started
+
+                self.rows += rows
+                self.flushes += 1
+                self.flush_seconds += elapsed
+                self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+                error = None
+                break
+
+            except Exception as e:
+                error = e
+                self.logger.warning(
+                    "Flush of %d rows failed (attempt %d): %s", rows, attempt + 1, e
+                )
+
+                # Start over on a fresh connection
+                self._disconnect()
+                time.sleep(min(2**attempt * 0.5, 5))
+
+        if error is not None:
+            self.failures += 1
+            self.logger.error("Dropping %d rows after %d attempts", rows, self.retries)
+
+        for idx, (_, on_done) in enumerate(batch):
+            if on_done:
+                try:
+                    on_done(rejected.get(idx, error))
+                except Exception as e:
+                    self.logger.error("Ingest callback failed: %s", e)
+
+    def _run(self):
+        batch: list[tuple[pd.DataFrame, OnDone | None]] = []
+        batch_rows = 0
+        deadline = None
+        # Queue items that are only marked done once their batch is flushed
+        held = 0
+
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+
+            try:
+                item = self.queue.get(timeout=timeout)
+                held += 1
+            except queue.Empty:
+                item = _FLUSH
+
+            if item is not _FLUSH and item is not _CLOSE:
+                batch.append(item)
+                batch_rows += len(item[0])
+                deadline = deadline or time.monotonic() + self.linger
+
+                if batch_rows < self.max_rows:
+                    continue
+
+            if batch:
+                self._write(batch)
+
+            batch, batch_rows, deadline = [], 0, None
+
+            for _ in range(held):
+                self.queue.task_done()
+            held = 0
+
+            if item is _CLOSE:
+                self._disconnect()
+                return
@@ -0,0 +1,223 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from questdb.ingress import Sender, ServerTimestamp
+from datastore import Database
+
+SYMBOL_COLUMNS = [
+    "query_key",
+    "fetch_key",
+    "source",
+    "ticker",
+    "tick_size",
+    "name",
+    "segment",
+    "market",
+    "exchange",
+    "exchange_token",
+    "lot_size",
+    "multiplier",
+    "active",
+    "priority",
+    "updated_at",
+    "created_at",
+]
+
+# Fields owned by the instrument master, a change in any of them updates the row
+TRACKED_COLUMNS = [
+    "fetch_key",
+    "source",
+    "ticker",
+    "tick_size",
+    "name",
+    "segment",
+    "market",
+    "exchange",
+    "exchange_token",
+    "lot_size",
+    "multiplier",
+    "active",
+]
+
+STRING_COLUMNS = ["query_key", "fetch_key", "ticker", "name", "exchange_token"]
+SYMBOL_TYPE_COLUMNS = ["source", "segment", "market", "exchange"]
+
+STAGING_TABLE = "symbols_staging"
+
+# ILP rows become visible once QuestDB commits them, staging waits for that
+STAGE_TIMEOUT = float(os.getenv("SYMBOLS_STAGE_TIMEOUT", "30"))
+STAGE_POLL_INTERVAL = 0.5
+
+
+def load_symbols(db: Database) -> pd.DataFrame:
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT {', '.join(SYMBOL_COLUMNS)} FROM symbols")
+            rows = cursor.fetchall()
+
+    df = pd.DataFrame(rows, columns=SYMBOL_COLUMNS)
+    return df.drop_duplicates("query_key", keep="last")
+
+
+def _normalise(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+
+    for column in STRING_COLUMNS:
+        df[column] = df[column].fillna("").astype(str)
+
+    for column in ["tick_size", "lot_size", "multiplier"]:
+        df[column] = pd.to_numeric(df[column]).astype("float64")
+
+    df["active"] = df["active"].fillna(True).astype(bool)
+    df["priority"] = df["priority"].fillna(False).astype(bool)
+
+    return df
+
+
+def diff_symbols(
+    existing: pd.DataFrame, incoming: pd.DataFrame, now: datetime
+) -> tuple[pd.DataFrame, dict[str, int]]:
+    """
+    Returns the full target symbols table and counts of inserted, updated and
+    deactivated rows. Priority and created_at are kept from existing rows;
+    instruments of the fetched exchange segments that are missing from the
+    master are marked inactive.
+    """
+    existing = _normalise(existing)
+    incoming = incoming.drop_duplicates("query_key", keep="first").copy()
+    incoming["active"] = True
+    incoming = _normalise(incoming)
+
+    merged = existing.merge(
+        incoming[["query_key", *TRACKED_COLUMNS]],
+        on="query_key",
+        how="outer",
+        suffixes=("", "_new"),
+        indicator=True,
+    )
+
+    is_new = (merged["_merge"] == "right_only").to_numpy()
+    is_missing = (merged["_merge"] == "left_only").to_numpy()
+
+    # Only segments present in the dumps were fetched, a segment filter
+    # mustn't deactivate everything outside of it
+    scope = set(zip(incoming["exchange"], incoming["segment"]))
+    in_scope = np.array(
+        [pair in scope for pair in zip(merged["exchange"], merged["segment"])],
+        dtype=bool,
+    )
+    is_gone = is_missing & in_scope
+
+    for column in TRACKED_COLUMNS:
+        merged[column] = merged[column + "_new"].where(~is_missing, merged[column])
+
+    # Delisted instruments are kept for their history, but no longer synced
+    merged.loc[is_gone, "active"] = False
+    merged = _normalise(merged)
+
+    original = existing.set_index("query_key")[TRACKED_COLUMNS]
+    current = merged.set_index("query_key")[TRACKED_COLUMNS]
+    aligned = original.reindex(current.index)
+
+    changed = np.zeros(len(merged), dtype=bool)
+    for column in TRACKED_COLUMNS:
+        before = aligned[column].to_numpy()
+        after = current[column].to_numpy()
+        changed |= ~((before == after) | (pd.isna(before) & pd.isna(after)))
+
+    is_updated = changed & ~is_new
+    is_deactivated = is_gone & is_updated
+
+    merged.loc[is_new, "priority"] = False
+    merged.loc[is_new, "created_at"] = now
+    merged.loc[changed, "updated_at"] = now
+    merged["created_at"] = pd.to_datetime(merged["created_at"]).fillna(now)
+    merged["updated_at"] = pd.to_datetime(merged["updated_at"]).fillna(now)
+
+    stats = {
+        "inserted": int(is_new.sum()),
+        "updated": int((is_updated & ~is_deactivated).sum()),
+        "deactivated": int(is_deactivated.sum()),
+    }
+
+    return merged[SYMBOL_COLUMNS], stats
+
+
+def _stage(db: Database, df: pd.DataFrame):
+    with db.get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            cursor.execute(f"CREATE TABLE {STAGING_TABLE} (LIKE symbols)")
+        conn.commit()
+
+    with Sender.from_env() as sender:
+        sender.dataframe(
+            df=df,
+            table_name=STAGING_TABLE,
+            symbols=SYMBOL_TYPE_COLUMNS,
+            at=ServerTimestamp,
+        )
+
+    deadline = time.monotonic() + STAGE_TIMEOUT
+
+    while True:
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(f"SELECT count() FROM {STAGING_TABLE}")
+                staged = cursor.fetchone()[0]  # type: ignore
+
+        if staged >= len(df) or time.monotonic() >= deadline:
+            break
+
+        time.sleep(STAGE_POLL_INTERVAL)
+
+    if staged != len(df):
+        raise ValueError(f"Staged {staged} symbols, expected {len(df)}")
+
+
+def apply_symbols(db: Database, inserts: pd.DataFrame, updates: pd.DataFrame):
+    """
+    Updates changed rows in place from a staging table written over ILP,
+    then appends new instruments. `symbols` stays readable throughout, and
+    priority is never written, so flags set during a sync are kept.
+    """
+    if not updates.empty:
+        _stage(db, updates)
+
+        assignments = ", ".join(
+            f"{column} = s.{column}" for column in [*TRACKED_COLUMNS, "updated_at"]
+        )
+        with db.get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    UPDATE symbols SET {assignments}
+                    FROM {STAGING_TABLE} s
+                    WHERE symbols.query_key = s.query_key
+                    """
+                )
+                cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            conn.commit()
+
+    if not inserts.empty:
+        with Sender.from_env() as sender:
+            sender.dataframe(
+                df=inserts,
+                table_name="symbols",
+                symbols=SYMBOL_TYPE_COLUMNS,
+                at=ServerTimestamp,
+            )
+
+
+def upsert_symbols(db: Database, incoming: pd.DataFrame) -> dict[str, int]:
+    now = datetime.now()
+    existing = load_symbols(db)
+    df, stats = diff_symbols(existing, incoming, now)
+
+    touched = df[df["updated_at"] == now]
+    is_known = touched["query_key"].isin(existing["query_key"])
+    apply_symbols(db, inserts=touched[~is_known], updates=touched[is_known])
+
+    return stats
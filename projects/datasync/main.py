@@ -1,13 +1,20 @@
+import time
 import asyncio
 import pytz
-import json
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from questdb.ingress import Sender
 from sources.upstox import UpstoxClient
-from datastore import Database, DataStore
-from kafkalib import Kafka, Topics
+from fetcher import FetchEngine, UPSTOX_RATE_LIMITS
+from watermarks import WatermarkStore
+from ingest import IngestService
+from backfill import Backfill, split_date_range, BACKFILL_DEADLINE
+from sessions import SessionCalendar
+from gaps import GapDetector, GAP_LOOKBACK_DAYS, fetch_ranges, fill_gaps
+from aggregator import BarAggregator, session_bounds
+from instruments import upsert_symbols
+from datastore import Database, DataStore, SymbolCache
+from kafkalib import Kafka, Topics, encode_bar, get_producer, partition_for
 from coreutils import Logger, scheduler, CronTrigger
 
 log = Logger("datasync")
@@ -17,33 +24,17 @@ load_dotenv()
 db = Database()
 ds = DataStore()
 client = UpstoxClient()
+watermarks = WatermarkStore()
+ingest = IngestService(logger=logger)
 
 local_tz = pytz.timezone("Asia/Kolkata")
 
-tf_multiplier = {
-    "1M": 1,
-    "2M": 2,
-    "3M": 3,
-    "5M": 5,
-    "10M": 10,
-    "15M": 15,
-    "30M": 30,
-    "1H": 60,
-    "4H": 240,
-}
-
-resample_freq = {
-    "1M": "1T",
-    "2M": "2T",
-    "3M": "3T",
-    "5M": "5T",
-    "10M": "10T",
-    "15M": "15T",
-    "30M": "30T",
-    "1H": "1H",
-    "4H": "4H",
-    "1D": "1D",
-}
+aggregator = BarAggregator(local_tz)
+producer = get_producer()
+gap_detector = GapDetector(db, SessionCalendar(local_tz))
+backfill = Backfill(
+    client, ingest, watermarks, local_tz, logger=logger, cache=ds.cache
+)
 
 
 def get_priority_tickers_list():
@@ -79,271 +70,240 @@ def get_non_priority_tickers_list():
         return tickers
 
 
-def latest_data_timestamp(ticker):
+def load_watermarks():
+    """Seeds watermarks for every ticker with a single LATEST ON scan"""
     query = """
-                SELECT ts, ticker 
+                SELECT ticker, ts
                 FROM market_data
-                WHERE ticker = %s 
-                ORDER BY ts DESC;
+                LATEST ON ts PARTITION BY ticker;
             """
 
+    started = time.monotonic()
     with db.get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(query, (ticker["query_key"],))
+        cursor.execute(query)
+        marks = cursor.fetchall()
 
-        data = cursor.fetchone()
+    watermarks.seed(marks)
+    logger.info(
+        "Watermarks loaded for %d tickers in %.2fs",
+        len(marks),
+        time.monotonic() - started,
+    )
 
-        if data is None:
-            return None
-        else:
-            return data[0]
 
+def get_watermark(ticker: dict[str, str]) -> datetime | None:
+    return watermarks.get(ticker["query_key"])
 
-def fetch_data_historic(ticker: dict[str, str], latest_ts: datetime | None = None):
-    if latest_ts is None:
-        candles = client.fetch_historical_data(
-            ticker["fetch_key"],
-            datetime.now(),
-        )
 
-    else:
-        candles = client.fetch_historical_data(
-            ticker["fetch_key"], datetime.now(), latest_ts
-        )
+async def fetch_data_historic(
+    engine: FetchEngine, ticker: dict[str, str], latest_ts: datetime | None = None
+):
+    # The historical API ends at the previous session, today's candles
+    # come from the intraday API
+    yesterday = datetime.now(local_tz).date() - timedelta(days=1)
 
-    return candles
+    if latest_ts is None:
+        return await client.fetch_historical_data_async(
+            engine, ticker["fetch_key"], yesterday
+        )
 
+    # Long gaps are fetched as concurrent API-sized ranges and merged
+    ranges = split_date_range(latest_ts.astimezone(local_tz).date(), yesterday)
 
-def fetch_data_intraday(ticker: dict[str, str]):
-    candles = client.fetch_intraday_data(
-        ticker["fetch_key"],
+    return await fetch_ranges(
+        client, engine, ticker["fetch_key"], ranges, since=latest_ts
     )
 
-    return candles
-
 
 def save_data(ticker, data):
+    if data.empty:
+        return
+
     df = pd.DataFrame(
         data, columns=["ts", "open", "high", "low", "close", "volume", "oi"]
     )
     df["ticker"] = ticker["query_key"]
     df["ts"] = pd.to_datetime(df["ts"])
+    latest_ts = df["ts"].max().to_pydatetime()
+    days = set(df["ts"].dt.tz_convert(local_tz).dt.date)
 
-    with Sender.from_env() as sender:
-        sender.dataframe(
-            df=df,
-            table_name="market_data",
-            symbols=["ticker"],
-            at="ts",
-        )
+    def on_done(error: Exception | None):
+        if error is not None:
+            logger.error("Failed to ingest data for %s: %s", ticker["query_key"], error)
+            return
 
-    logger.info("Data Ingested for Ticker: %s", ticker["query_key"])
+        # Gap repair writes past days, cached reads of them are stale now
+        ds.cache.invalidate_days(ticker["query_key"], days)
+        watermarks.update(ticker["query_key"], latest_ts)
+        logger.info("Data Ingested for Ticker: %s", ticker["query_key"])
 
+    ingest.submit(df, on_done=on_done)
 
-def fetch_data(tick: dict[str, str]):
-    latest_ts: datetime | None = latest_data_timestamp(tick)
 
-    data = None
+def sync_instruments():
+    started = time.perf_counter()
+    nse, nse_changed = client.fetch_instruments("NSE")
+    bse, bse_changed = client.fetch_instruments("BSE")
 
-    # Fetch historic data if no data or data is old
-    if latest_ts is None:
-        data = fetch_data_historic(tick)
+    # Unchanged dumps come from the local cache, they're still diffed so a
+    # failed upsert or a reset database is repaired on the next sync
+    if not (nse_changed or bse_changed):
+        logger.info("Instrument dumps unchanged, diffing cached instruments")
 
-    else:
-        today = datetime.now().date()
-        latest_date = latest_ts.date()
+    df = pd.concat([nse, bse], ignore_index=True)
+    stats = upsert_symbols(db, df)
 
-        if latest_date < today:
-            data = fetch_data_historic(tick, latest_ts)
+    if any(stats.values()):
+        SymbolCache.invalidate()
 
-    # Fetch Intraday data
-    if data is None:
-        data = fetch_data_intraday(tick)
-        return data
-    else:
-        current_data = fetch_data_intraday(tick)
-        data = pd.concat([data, current_data], ignore_index=True)
-        return data
+    logger.info(
+        "Instruments synced in %.2fs: %d new, %d updated, %d deactivated",
+        time.perf_counter() - started,
+        stats["inserted"],
+        stats["updated"],
+        stats["deactivated"],
+    )
 
+    return stats["inserted"]
 
-def sync_instruments():
-    nse = client.fetch_nse_instruments()
-    bse = client.fetch_bse_instruments()
 
-    df = pd.concat([nse, bse], ignore_index=True)
-    now = datetime.now().isoformat()
-    df["updated_at"] = now
-    df["created_at"] = now
+def seed_aggregator(tick: dict[str, str]):
+    session_open, _ = session_bounds(datetime.now(local_tz))
+    data_1M = ds.get_historic_data(
+        ticker=tick["query_key"],
+        freq="1M",
+        start_date=session_open.isoformat(),
+    )
 
-    existing_keys = set()
-    with db.get_connection() as conn:
-        cursor = conn.cursor()
-        try:
-            cursor.execute("SELECT query_key FROM symbols")
-            existing_keys = {row[0] for row in cursor.fetchall()}
-        except Exception as e:
-            logger.error(f"Error fetching existing keys: {e}")
+    aggregator.seed(tick["query_key"], data_1M)
+    logger.info("Bar aggregator seeded for ticker: %s", tick["query_key"])
 
-        # Filter out existing records
-    df = df[~df["query_key"].isin(existing_keys)]
 
-    if df.empty:
-        logger.info("No new instruments to add")
-        return 0
+def trigger_kafka_events(tick: dict[str, str], data):
+    logger.info("Init: Kafka Events Trigger")
 
-    # Insert new records in batches
-    batch_size = 1000
-    inserted_count = 0
+    feed_1M = Topics.FEED_1M.value
+    key = tick["query_key"].encode("utf-8")
+    partition = partition_for(key)
+
+    if not aggregator.is_seeded(tick["query_key"]):
+        seed_aggregator(tick)
+
+    # Only bars of the current session are published, oldest first
+    session_open, _ = session_bounds(datetime.now(local_tz))
+    data = data.assign(dt=pd.to_datetime(data["ts"]))
+    data = data[data["dt"] >= session_open].sort_values("dt")
+
+    # A failed publish rolls the aggregator back and skips saving, the next
+    # run re-fetches the same minutes and re-emits the bars they close
+    with aggregator.transaction(tick["query_key"]):
+        for row in data.itertuples():
+            message = {
+                "ticker": tick["query_key"],
+                "ts": row.ts,
+                "open": float(row.open),
+                "high": float(row.high),
+                "low": float(row.low),
+                "close": float(row.close),
+                "volume": int(row.volume),
+                "oi": float(row.oi),
+            }
+
+            producer.produce(
+                topic=feed_1M.name,
+                key=key,
+                partition=partition,
+                value=encode_bar(message),
+            )
 
-    with db.get_connection() as conn:
-        cursor = conn.cursor()
+            logger.info("Producing 1M data for ticker: %s", tick["query_key"])
+
+            for tf, bar in aggregator.update(tick["query_key"], message):
+                topic = Topics["FEED_" + tf].value
+
+                message_tf = {
+                    "ticker": tick["query_key"],
+                    "ts": bar["ts"],
+                    "open": bar["open"],
+                    "high": bar["high"],
+                    "low": bar["low"],
+                    "close": bar["close"],
+                    "volume": bar["volume"],
+                    "oi": bar["oi"],
+                }
+
+                producer.produce(
+                    topic=topic.name,
+                    key=key,
+                    partition=partition,
+                    value=encode_bar(message_tf),
+                )
 
-        # Prepare the insert query with placeholders
-        query = """
-            INSERT INTO symbols (
-                query_key, fetch_key, source, ticker, tick_size,
-                name, segment, market, exchange, exchange_token,
-                lot_size, multiplier, priority, active,
-                updated_at, created_at
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                %s, %s, %s, %s, %s, %s
-            )
-        """
-
-        values = [
-            tuple(row)
-            for row in df[
-                [
-                    "query_key",
-                    "fetch_key",
-                    "source",
-                    "ticker",
-                    "tick_size",
-                    "name",
-                    "segment",
-                    "market",
-                    "exchange",
-                    "exchange_token",
-                    "lot_size",
-                    "multiplier",
-                    "priority",
-                    "active",
-                    "updated_at",
-                    "created_at",
-                ]
-            ].to_records(index=False)
-        ]
-
-        # Insert in batches
-        for i in range(0, len(values), batch_size):
-            batch = values[i : i + batch_size]
-            try:
-                cursor.executemany(query, batch)
-                inserted_count += len(batch)
                 logger.info(
-                    f"Inserted batch {i // batch_size + 1}/{(len(values) + batch_size - 1) // batch_size}"
+                    f"Data for {tf} timeframe produced for {tick['query_key']}"
                 )
-            except Exception as e:
-                logger.error(f"Error inserting batch: {e}")
 
-    logger.info(f"Successfully added {inserted_count} new instruments")
-    return inserted_count
 
+def process_priority_ticker(tick: dict[str, str], data):
+    if data.empty:
+        logger.info("No new candles for ticker: %s", tick["query_key"])
+        return
 
-def trigger_kafka_events(tick: dict[str, str], data):
-    logger.info("Init: Kafka Events Trigger")
-
-    k = Kafka()
-    app = k.get_app()
-
-    feed_1M = app.topic(name=Topics.FEED_1M.value.name, value_serializer="json")
-    row = data.iloc[0]
-
-    message = {
-        "ticker": tick["query_key"],
-        "ts": row["ts"],
-        "open": float(row["open"]),
-        "high": float(row["high"]),
-        "low": float(row["low"]),
-        "close": float(row["close"]),
-        "volume": int(row["volume"]),
-        "oi": float(row["oi"]),
-    }
-
-    with app.get_producer() as producer:
-        kafka_msg = feed_1M.serialize(key=message["ticker"], value=message)
-
-        producer.produce(
-            topic=feed_1M.name,
-            key=kafka_msg.key,
-            value=kafka_msg.value,
+    # Produce only enqueues, delivery is retried by the producer and
+    # failures are reported from its delivery callback
+    try:
+        trigger_kafka_events(tick, data)
+        logger.info("Events produced for ticker: %s", tick["query_key"])
+    except Exception as e:
+        # Not saved, so the watermark stays put and the next run fetches
+        # and publishes these minutes again
+        logger.error(
+            "Failed to produce Kafka events for %s: %s", tick["query_key"], str(e)
         )
+        return
 
-        message["ts"] = datetime.fromisoformat(message["ts"]).astimezone(local_tz)
-        data_1M = ds.get_historic_data(
-            ticker=message["ticker"],
-            freq="1M",
-        )
+    # Batched and retried by the ingest service
+    save_data(tick, data)
+
+
+async def fetch_data_async(engine: FetchEngine, tick: dict[str, str]):
+    latest_ts: datetime | None = get_watermark(tick)
+
+    data = None
+
+    # Fetch historic data if no data or data is old
+    if latest_ts is None or latest_ts.date() < datetime.now().date():
+        data = await fetch_data_historic(engine, tick, latest_ts)
 
-        logger.info("Producing 1M data for ticker: %s", tick["query_key"])
-
-        if data_1M is not None:
-            df = pd.DataFrame([message])
-            df.set_index("ts", inplace=True)
-            data_1M = pd.concat([data_1M, df])
-            data_1M = data_1M.sort_index()
-
-            timeframe = ["2M", "3M", "5M", "10M", "15M", "30M", "1H", "4H"]
-            now = datetime.now()
-            start_of_market = now.replace(hour=9, minute=15, second=0, microsecond=0)
-            time_diff = (now - start_of_market).total_seconds() / 60
-
-            for tf in timeframe:
-                if int(time_diff % tf_multiplier[tf]) == 0:
-                    topic = Topics["FEED_" + tf].value
-                    freq = resample_freq[tf]
-                    data_tf = data_1M.resample(freq).agg(
-                        {
-                            "open": "first",
-                            "high": "max",
-                            "low": "min",
-                            "close": "last",
-                            "volume": "sum",
-                            "oi": "last",
-                        }
-                    )
-
-                    row = data_tf.iloc[-1]
-
-                    ts = (
-                        pd.to_datetime(str(row.name))
-                        if row.name is not None
-                        else pd.Timestamp.now()
-                    )
-
-                    message_tf = {
-                        "ticker": tick["query_key"],
-                        "ts": ts.isoformat(),
-                        "open": float(row["open"]),
-                        "high": float(row["high"]),
-                        "low": float(row["low"]),
-                        "close": float(row["close"]),
-                        "volume": int(row["volume"]),
-                        "oi": int(row["oi"]),
-                    }
-
-                    message_tf = json.dumps(message_tf).encode("utf-8")
-
-                    producer.produce(
-                        topic=topic.name,
-                        key=kafka_msg.key,
-                        value=message_tf,
-                    )
-
-                    logger.info(
-                        f"Data for {tf} timeframe produced for {tick['query_key']}"
-                    )
+    # Fetch Intraday data
+    current_data = await client.fetch_intraday_data_async(
+        engine, tick["fetch_key"], since=latest_ts
+    )
+
+    if data is None:
+        return current_data
+
+    return pd.concat([data, current_data], ignore_index=True)
+
+
+async def run_priority_tickers(tickers: list[dict[str, str]]):
+    async def worker(tick: dict[str, str]):
+        data = await fetch_data_async(engine, tick)
+        logger.info("Data fetched for ticker: %s", tick["query_key"])
+
+        await asyncio.to_thread(process_priority_ticker, tick, data)
+
+    async with FetchEngine(rate_limits={client.HOST: UPSTOX_RATE_LIMITS}) as engine:
+        results = await engine.map(tickers, worker)
+
+    for tick, result in results:
+        if isinstance(result, BaseException):
+            logger.error(
+                "Error processing ticker %s: %s",
+                tick["query_key"],
+                repr(result),
+            )
 
 
 def fetch_priority_tickers():
@@ -351,110 +311,90 @@ def fetch_priority_tickers():
         tickers = get_priority_tickers_list()
         logger.info("Priority Tickers Fetched: %s", len(tickers))
 
-        for tick in tickers:
-            try:
-                data = fetch_data(tick)
-                logger.info("Data fetched for ticker: %s", tick["query_key"])
-
-                # Retry Kafka events up to 3 times
-                for attempt in range(3):
-                    try:
-                        trigger_kafka_events(tick, data)
-                        logger.info("Events produced for ticker: %s", tick["query_key"])
-                        break
-                    except Exception as e:
-                        if attempt == 2:  # Last attempt
-                            logger.error(
-                                "Failed to produce Kafka events for %s after 3 attempts: %s",
-                                tick["query_key"],
-                                str(e),
-                            )
-                        else:
-                            logger.warning(
-                                "Retrying Kafka events for %s (attempt %d): %s",
-                                tick["query_key"],
-                                attempt + 1,
-                                str(e),
-                            )
-                            continue
-
-                # Retry saving data up to 3 times
-                for attempt in range(3):
-                    try:
-                        save_data(tick, data)
-                        logger.info("Data ingested for ticker: %s", tick["query_key"])
-                        break
-                    except Exception as e:
-                        if attempt == 2:  # Last attempt
-                            logger.error(
-                                "Failed to save data for %s after 3 attempts: %s",
-                                tick["query_key"],
-                                str(e),
-                            )
-                        else:
-                            logger.warning(
-                                "Retrying save data for %s (attempt %d): %s",
-                                tick["query_key"],
-                                attempt + 1,
-                                str(e),
-                            )
-                            continue
-
-            except Exception as e:
-                logger.error(
-                    "Error processing ticker %s: %s", tick["query_key"], str(e)
-                )
-                continue
+        started = time.monotonic()
+        if not watermarks.seeded:
+            load_watermarks()
+
+        asyncio.run(run_priority_tickers(tickers))
+        ingest.flush()
+        watermarks.save()
+        ingest.log_stats()
+        logger.info(
+            "Priority Tickers processed in %.2fs", time.monotonic() - started
+        )
 
     except Exception as e:
         logger.error("Error in fetch_priority_tickers: %s", str(e))
 
 
+async def run_gap_repair(tickers: list[dict[str, str]]):
+    today = datetime.now(local_tz).date()
+
+    async with FetchEngine(
+        deadline=BACKFILL_DEADLINE, rate_limits={client.HOST: UPSTOX_RATE_LIMITS}
+    ) as engine:
+        results = await fill_gaps(
+            client,
+            engine,
+            gap_detector,
+            tickers,
+            today - timedelta(days=GAP_LOOKBACK_DAYS),
+            today - timedelta(days=1),
+        )
+
+    for tick, result in results:
+        if isinstance(result, BaseException):
+            logger.error(
+                "Gap repair failed for ticker %s: %s", tick["query_key"], repr(result)
+            )
+            continue
+
+        if not result.empty:
+            logger.info(
+                "Repairing %d missing bars for ticker: %s", len(result), tick["query_key"]
+            )
+            save_data(tick, result)
+
+
+def repair_gaps():
+    try:
+        tickers = get_priority_tickers_list()
+        logger.info("Checking %d priority tickers for gaps", len(tickers))
+
+        started = time.monotonic()
+        asyncio.run(run_gap_repair(tickers))
+        ingest.flush()
+        logger.info("Gap repair finished in %.2fs", time.monotonic() - started)
+
+    except Exception as e:
+        logger.error("Error in repair_gaps: %s", str(e))
+
+
 def fetch_non_priority_tickers():
     try:
         logger.info("Fetching Non-Priority Tickers")
         tickers = get_non_priority_tickers_list()
-        for tick in tickers:
-            try:
-                data = fetch_data(tick)
-                logger.info("Data fetched for ticker: %s", tick["query_key"])
-
-                # Retry saving data up to 3 times
-                for attempt in range(3):
-                    try:
-                        save_data(tick, data)
-                        logger.info("Data ingested for ticker: %s", tick["query_key"])
-                        break
-                    except Exception as e:
-                        if attempt == 2:  # Last attempt
-                            logger.error(
-                                "Failed to save data for %s after 3 attempts: %s",
-                                tick["query_key"],
-                                str(e),
-                            )
-                        else:
-                            logger.warning(
-                                "Retrying save data for %s (attempt %d): %s",
-                                tick["query_key"],
-                                attempt + 1,
-                                str(e),
-                            )
-                            continue
-
-            except Exception as e:
-                logger.error(
-                    "Error processing ticker %s: %s", tick["query_key"], str(e)
-                )
-                continue
+        load_watermarks()
+
+        # Resumes from the checkpoint if an earlier run today was interrupted
+        asyncio.run(backfill.run(tickers))
 
     except Exception as e:
         logger.error("Error in fetch_non_priority_tickers: %s", str(e))
 
+    finally:
+        ingest.flush()
+        watermarks.save()
+        ingest.log_stats()
+
 
 if __name__ == "__main__":
     sync_instruments()
     logger.info("Instrumenst Synced Successfully")
 
+    load_watermarks()
+    Kafka().ensure_topics()
+
     loop = asyncio.get_event_loop()
 
     priority_trigger = CronTrigger(
@@ -474,6 +414,22 @@ if __name__ == "__main__":
         coalesce=False,
     )
 
+    # Priority tickers - fill holes left in the last few sessions
+    gap_trigger = CronTrigger(
+        hour="16",
+        day_of_week="1-5",
+        timezone="Asia/Kolkata",
+    )
+    scheduler.add_job(
+        repair_gaps,
+        trigger=gap_trigger,
+        id="repair_gaps",
+        name="Repair Priority Ticker Gaps",
+        max_instances=1,
+        misfire_grace_time=60,
+        coalesce=True,
+    )
+
     # Non-priority tickers - every 5 minutes during market hours
     non_priority_trigger = CronTrigger(
         hour="20",
@@ -502,4 +458,6 @@ if __name__ == "__main__":
     except KeyboardInterrupt:
         logger.info("CLI Tool Stopped")
         scheduler.shutdown(wait=True)
+        ingest.close()
+        producer.flush()
         loop.close()
@@ -0,0 +1,71 @@
+import os
+import pandas as pd
+from datetime import date, datetime, time, timedelta, tzinfo
+from aggregator import SESSION_OPEN, SESSION_CLOSE
+
+# One ISO date per line, lines starting with # are ignored
+MARKET_HOLIDAYS_FILE = os.getenv("MARKET_HOLIDAYS_FILE", "holidays.txt")
+
+
+def load_holidays(path: str = MARKET_HOLIDAYS_FILE) -> set[date]:
+    if not os.path.exists(path):
+        return set()
+
+    with open(path, "r", encoding="utf-8") as f:
+        return {
+            date.fromisoformat(line.strip())
+            for line in f
+            if line.strip() and not line.startswith("#")
+        }
+
+
+class SessionCalendar:
+    """Exchange trading days and the 1M bars expected in each session"""
+
+    def __init__(
+        self,
+        tz: tzinfo,
+        holidays: set[date] | None = None,
+        session_open: tuple[int, int] = SESSION_OPEN,
+        session_close: tuple[int, int] = SESSION_CLOSE,
+    ):
+        self.tz = tz
+        self.holidays = load_holidays() if holidays is None else holidays
+        self.session_open = time(*session_open)
+        self.session_close = time(*session_close)
+
+    def is_trading_day(self, day: date) -> bool:
+        return day.weekday() < 5 and day not in self.holidays
+
+    def trading_days(self, start: date, end: date) -> list[date]:
+        days = []
+
+        while start <= end:
+            if self.is_trading_day(start):
+                days.append(start)
+            start += timedelta(days=1)
+
+        return days
+
+    def bounds(self, day: date) -> tuple[pd.Timestamp, pd.Timestamp]:
+        session_open = pd.Timestamp(datetime.combine(day, self.session_open))
+        session_close = pd.Timestamp(datetime.combine(day, self.session_close))
+
+        return session_open.tz_localize(self.tz), session_close.tz_localize(self.tz)
+
+    def minutes(self, day: date) -> pd.DatetimeIndex:
+        """UTC start times of every 1M bar of the session"""
+        session_open, session_close = self.bounds(day)
+
+        return pd.date_range(
+            session_open, session_close, freq="1min", inclusive="left"
+        ).tz_convert("UTC")
+
+    @property
+    def bars_per_session(self) -> int:
+        return (
+            self.session_close.hour * 60
+            + self.session_close.minute
+            - self.session_open.hour * 60
+            - self.session_open.minute
+        )
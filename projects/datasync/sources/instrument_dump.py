@@ -0,0 +1,137 @@
+import os
+import json
+import zlib
+import ijson
+import requests
+import pandas as pd
+
+INSTRUMENTS_CACHE_DIR = os.getenv("INSTRUMENTS_CACHE_DIR", ".cache/instruments")
+
+# Comma separated raw segments to keep, e.g. "NSE_EQ,BSE_EQ,NSE_INDEX", empty keeps all
+INSTRUMENT_SEGMENTS = [
+    segment.strip()
+    for segment in os.getenv("INSTRUMENT_SEGMENTS", "").split(",")
+    if segment.strip()
+]
+
+DUMP_FIELDS = [
+    "instrument_key",
+    "trading_symbol",
+    "underlying_symbol",
+    "qty_multiplier",
+    "segment",
+    "tick_size",
+    "name",
+    "exchange_token",
+    "lot_size",
+]
+
+CHUNK_SIZE = 1 << 20
+
+
+class InstrumentDump:
+    """
+    Downloads a gzipped JSON instrument dump with a conditional GET and
+    streams it into columns, one instrument at a time. The parsed frame is
+    cached as Parquet next to the response validators, so an unchanged dump
+    is neither downloaded nor parsed again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        segments: list[str] | None = None,
+        cache_dir: str = INSTRUMENTS_CACHE_DIR,
+    ):
+        self.name = name
+        self.url = url
+        self.segments = sorted(INSTRUMENT_SEGMENTS if segments is None else segments)
+        self.meta_path = os.path.join(cache_dir, f"{name}.meta.json")
+        self.frame_path = os.path.join(cache_dir, f"{name}.parquet")
+
+    def _read_meta(self) -> dict:
+        if not os.path.exists(self.meta_path) or not os.path.exists(self.frame_path):
+            return {}
+
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+
+        # A different segment filter means the cached frame doesn't apply
+        if meta.get("segments") != self.segments:
+            return {}
+
+        return meta
+
+    def _write(self, df: pd.DataFrame, response: requests.Response):
+        os.makedirs(os.path.dirname(self.frame_path), exist_ok=True)
+
+        tmp_path = self.frame_path + ".tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.frame_path)
+
+        meta = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "segments": self.segments,
+        }
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def parse(self, chunks) -> dict[str, list]:
+        columns: dict[str, list] = {field: [] for field in DUMP_FIELDS}
+        segments = set(self.segments)
+
+        items = ijson.sendable_list()
+        parser = ijson.items_coro(items, "item", use_float=True)
+        decompressor = None
+
+        def collect():
+            for item in items:
+                if segments and item.get("segment") not in segments:
+                    continue
+
+                for field in DUMP_FIELDS:
+                    columns[field].append(item.get(field))
+
+            del items[:]
+
+        for chunk in chunks:
+            # The dump is a .gz file, unless the server already decoded it
+            if decompressor is None:
+                gzipped = chunk[:2] == b"\x1f\x8b"
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else False
+
+            parser.send(decompressor.decompress(chunk) if decompressor else chunk)
+            collect()
+
+        parser.close()
+        collect()
+
+        return columns
+
+    def load(self, transform) -> tuple[pd.DataFrame, bool]:
+        """
+        Returns the transformed frame and whether the dump changed since the
+        last load. The cache only saves the download, callers still have to
+        apply an unchanged frame that may not have reached the database.
+        """
+        meta = self._read_meta()
+        headers = {}
+
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        with requests.get(self.url, headers=headers, stream=True, timeout=60) as response:
+            if response.status_code == 304:
+                return pd.read_parquet(self.frame_path), False
+
+            response.raise_for_status()
+            df = transform(self.parse(response.iter_content(CHUNK_SIZE)))
+            self._write(df, response)
+
+        return df, True
@@ -3,8 +3,10 @@ from dotenv import load_dotenv
 
 import pandas as pd
 import requests
-import gzip
-import json
+
+from fetcher import FetchEngine
+from watermarks import candles_since
+from sources.instrument_dump import InstrumentDump
 
 load_dotenv()
 
@@ -63,27 +65,59 @@ def transform_instruments(data, exchange: str):
     return df
 
 
+def candles_to_df(data):
+    df = pd.DataFrame(
+        data,
+        columns=[
+            "ts",
+            "open",
+            "high",
+            "low",
+            "close",
+            "volume",
+            "oi",
+        ],
+    )
+
+    return df
+
+
+def parse_candles_response(data):
+    if data["status"] == "success":
+        return data["data"]["candles"]
+    else:
+        print("[Error]", data)
+        raise Exception("Failed to fetch data from Upstox API")
+
+
 class UpstoxClient:
     def __init__(self):
         self.BASE_URL = "https://api-v2.upstox.com"
+        self.HOST = "api-v2.upstox.com"
+        self.instrument_dumps: dict[str, InstrumentDump] = {}
+
+    def fetch_instruments(self, exchange: str) -> tuple[pd.DataFrame, bool]:
+        """Returns the exchange's instruments and whether the dump changed"""
+        dump = self.instrument_dumps.get(exchange)
+
+        if dump is None:
+            dump = InstrumentDump(
+                exchange,
+                f"https://assets.upstox.com/market-quote/instruments/exchange/{exchange}.json.gz",
+            )
+            self.instrument_dumps[exchange] = dump
+
+        return dump.load(lambda data: transform_instruments(data, exchange))
 
     def fetch_nse_instruments(self):
-        url = "https://assets.upstox.com/market-quote/instruments/exchange/NSE.json.gz"
-        response = requests.get(url)
-        json_str = gzip.decompress(response.content)
-        data = json.loads(json_str)
-        df = transform_instruments(data, "NSE")
+        df, _ = self.fetch_instruments("NSE")
         return df
 
     def fetch_bse_instruments(self):
-        url = "https://assets.upstox.com/market-quote/instruments/exchange/BSE.json.gz"
-        response = requests.get(url)
-        json_str = gzip.decompress(response.content)
-        data = json.loads(json_str)
-        df = transform_instruments(data, "BSE")
+        df, _ = self.fetch_instruments("BSE")
         return df
 
-    def fetch_historical_data(
+    def historical_url(
         self,
         instrumentKey: str,
         toDate: date,
@@ -108,51 +142,54 @@ class UpstoxClient:
 
             url += f"/historical-candle/{instrumentKey}/1minute/{toDate}/{fromDate}"
 
-        results = requests.get(url)
-        data = results.json()
-        if data["status"] == "success":
-            data = data["data"]["candles"]
-        else:
-            print("[Error]", data)
-            raise Exception("Failed to fetch data from Upstox API")
-
-        df = pd.DataFrame(data)
-        df.columns = [
-            "ts",
-            "open",
-            "high",
-            "low",
-            "close",
-            "volume",
-            "oi",
-        ]
-
-        return df
+        return url
 
-    def fetch_intraday_data(self, instrumentKey: str):
+    def intraday_url(self, instrumentKey: str):
         if not instrumentKey:
             raise Exception("Instrument Key is not provided")
 
-        url = self.BASE_URL
-        url += f"/historical-candle/intraday/{instrumentKey}/1minute/"
+        return self.BASE_URL + f"/historical-candle/intraday/{instrumentKey}/1minute/"
 
+    def fetch_historical_data(
+        self,
+        instrumentKey: str,
+        toDate: date,
+        fromDate: date | None = None,
+        since: datetime | None = None,
+    ):
+        url = self.historical_url(instrumentKey, toDate, fromDate)
         results = requests.get(url)
-        data = results.json()
-        if data["status"] == "success":
-            data = data["data"]["candles"]
-        else:
-            print("[Error]", data)
-            raise Exception("Failed to fetch data from Upstox API")
+        data = candles_since(parse_candles_response(results.json()), since)
 
-        df = pd.DataFrame(data)
-        df.columns = [
-            "ts",
-            "open",
-            "high",
-            "low",
-            "close",
-            "volume",
-            "oi",
-        ]
+        return candles_to_df(data)
 
-        return df
+    def fetch_intraday_data(self, instrumentKey: str, since: datetime | None = None):
+        url = self.intraday_url(instrumentKey)
+        results = requests.get(url)
+        data = candles_since(parse_candles_response(results.json()), since)
+
+        return candles_to_df(data)
+
+    async def fetch_historical_data_async(
+        self,
+        engine: FetchEngine,
+        instrumentKey: str,
+        toDate: date,
+        fromDate: date | None = None,
+        since: datetime | None = None,
+    ):
+        url = self.historical_url(instrumentKey, toDate, fromDate)
+        data = candles_since(parse_candles_response(await engine.get_json(url)), since)
+
+        return candles_to_df(data)
+
+    async def fetch_intraday_data_async(
+        self,
+        engine: FetchEngine,
+        instrumentKey: str,
+        since: datetime | None = None,
+    ):
+        url = self.intraday_url(instrumentKey)
+        data = candles_since(parse_candles_response(await engine.get_json(url)), since)
+
+        return candles_to_df(data)
@@ -0,0 +1,96 @@
+import os
+import json
+import threading
+from datetime import datetime, timezone
+
+WATERMARKS_FILE = os.getenv("WATERMARKS_FILE", ".state/watermarks.json")
+
+
+def as_utc(ts: datetime) -> datetime:
+    # QuestDB returns naive UTC timestamps over PGWire
+    if ts.tzinfo is None:
+        return ts.replace(tzinfo=timezone.utc)
+
+    return ts.astimezone(timezone.utc)
+
+
+class WatermarkStore:
+    """
+    Last ingested candle timestamp per ticker, kept in memory and persisted
+    to a JSON file so restarts don't re-ingest the whole day.
+    """
+
+    def __init__(self, path: str = WATERMARKS_FILE):
+        self.path = path
+        self._marks: dict[str, datetime] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.seeded = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        self._marks = {
+            ticker: as_utc(datetime.fromisoformat(ts)) for ticker, ts in data.items()
+        }
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+
+            data = {ticker: ts.isoformat() for ticker, ts in self._marks.items()}
+            self._dirty = False
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+        os.replace(tmp_path, self.path)
+
+    def get(self, ticker: str) -> datetime | None:
+        return self._marks.get(ticker)
+
+    def update(self, ticker: str, ts: datetime):
+        ts = as_utc(ts)
+
+        with self._lock:
+            current = self._marks.get(ticker)
+
+            if current is None or ts > current:
+                self._marks[ticker] = ts
+                self._dirty = True
+
+    def seed(self, marks: list[tuple[str, datetime]]):
+        """Merges the latest stored timestamps, e.g. from a LATEST ON query"""
+        for ticker, ts in marks:
+            self.update(ticker, ts)
+
+        self.seeded = True
+
+
+def candles_since(candles: list[list], since: datetime | None) -> list[list]:
+    """
+    Drops candles at or before `since`. Upstox returns candles newest first,
+    so this stops at the first already-ingested candle instead of parsing
+    the whole day.
+    """
+    if since is None or not candles:
+        return candles
+
+    since = as_utc(since)
+
+    for idx, candle in enumerate(candles):
+        if datetime.fromisoformat(candle[0]) <= since:
+            return candles[:idx]
+
+    return candles
@@ -1,8 +1,7 @@
-import json
 from coreutils import Logger
 from brokerlib import UpstoxBroker
 from storelib import Store, Order
-from kafkalib import Kafka, Topics, SignalEvent
+from kafkalib import Kafka, Topics, SignalEvent, decode_signal
 from typing import Any
 
 store = Store()
@@ -499,15 +498,12 @@ if __name__ == "__main__":
                     # print("No Signals")
                     continue
 
-                value = res.value().decode("utf-8")
-                data = json.loads(value)
+                signal = decode_signal(res.value())
 
-                if data["type"] == "ENTRY":
-                    signal = SignalEvent.model_validate(data)
+                if signal.type == "ENTRY":
                     on_entry_signal(signal)
 
-                elif data["type"] == "EXIT":
-                    signal = SignalEvent.model_validate(data)
+                elif signal.type == "EXIT":
                     on_exit_signal(signal)
 
     except Exception as e:
@@ -1,24 +1,18 @@
-from pandas import DataFrame
-from strategylib import StrategyBuilder, Signal
-import pandas_ta as ta
+from strategylib import StrategyBuilder, Signal, Bars, EMA
 
 
-def strategyFunc(data: DataFrame):
+def strategyFunc(data: Bars):
     if len(data) < 12:
         print("Insufficient data for strategy execution. Need at least 19 data points.")
         print("Available:", len(data))
         return []
 
-    df = data.copy()
-    df["EMA_4"] = ta.ema(df["close"], length=4)
-    df["EMA_8"] = ta.ema(df["close"], length=8)
+    ema_4 = data.indicators["EMA_4"]
+    ema_8 = data.indicators["EMA_8"]
 
-    if df.empty:
-        return []
-
-    print("DX:", df)
+    print("DX:", data.ticker, data.close[-1], ema_4, ema_8)
 
-    if df["EMA_4"].iloc[-1] > df["EMA_8"].iloc[-1]:
+    if ema_4 > ema_8:
         return [
             Signal(
                 action="BUY",
@@ -28,7 +22,7 @@ def strategyFunc(data: DataFrame):
             )
         ]
 
-    elif df["EMA_8"].iloc[-1] < df["EMA_4"].iloc[-1]:
+    elif ema_8 < ema_4:
         return [
             Signal(
                 action="SELL",
@@ -45,5 +39,11 @@ strategy = StrategyBuilder(
     tickers=["IDEA.NSE"],
     broker="UPSTOX",
     strategy=strategyFunc,
+    data_format="numpy",
+    warmup=12,
+    indicators={
+        "EMA_4": EMA(length=4),
+        "EMA_8": EMA(length=8),
+    },
 )
 strategy.run()